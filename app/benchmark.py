@@ -0,0 +1,244 @@
+import datetime
+import gzip
+import platform
+import random
+import statistics
+import time
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from . import models, jalali, middleware
+
+# داده مصنوعی و سناریوهای زمان دار برای مقایسه کارایی بین اجراها.
+# فقط روی دیتابیس تست اجرا شود؛ دستور benchmark همین کار را انجام می دهد.
+
+MESSAGES_PER_DAY = 10
+PAYLOAD_SCENARIOS = ('chat_open', 'chat_update', 'chat_history')
+
+def seed(users=100, managers=5, conversations=30, messages=100, activities=5, rng=None):
+    rng = rng or random.Random(0)
+    password = make_password('benchmark')
+
+    def create_users(prefix, count, user_type, manager_ids=None):
+        objs = [
+            models.CustomUser(
+                username=f'{prefix}{i}',
+                first_name=prefix,
+                last_name=str(i),
+                password=password,
+                user_type=user_type,
+                manager_id=manager_ids[i % len(manager_ids)] if manager_ids else None,
+            )
+            for i in range(count)
+        ]
+        models.CustomUser.objects.bulk_create(objs, batch_size=500)
+        return list(models.CustomUser.objects.filter(username__startswith=prefix, user_type=user_type).order_by('pk'))
+
+    super_admin = create_users('benchmark-admin-', 1, '1')[0]
+    manager_users = create_users('benchmark-manager-', managers, '2')
+    employees = create_users('benchmark-employee-', users, '3', [manager.pk for manager in manager_users])
+
+    # bulk_create سیگنال ها را اجرا نمی کند؛ برای پروفایل ها تصویری ساخته نمی شود
+    models.Profile.objects.bulk_create([
+        models.Profile(
+            user=employee,
+            phone_number=f'09{employee.pk:09d}',
+            address='benchmark',
+            phone_number_1=f'09{employee.pk:09d}',
+            phone_number_2=f'09{employee.pk:09d}',
+            national_code=f'{employee.pk:010d}',
+            birthdate=jalali.JalaliDate(1370, 1 + employee.pk % 12, 1 + employee.pk % 28),
+            national_card='national_card/benchmark.jpg',
+            status='2',
+        )
+        for employee in employees
+    ], batch_size=500)
+
+    managers_by_pk = {manager.pk: manager for manager in manager_users}
+    pairs = []
+    for i in range(conversations):
+        employee = employees[i % len(employees)]
+        # دور اول تیکت کارمند با مدیرش است و دور دوم با مدیر کل؛ بعد از آن کلید یکتا ندارند
+        other = managers_by_pk[employee.manager_id] if i < len(employees) else super_admin
+        key = models.Conversation.direct_key(employee.pk, other.pk) if i < 2 * len(employees) else None
+        pairs.append((employee, other, key))
+    conversation_objs = models.Conversation.objects.bulk_create([
+        models.Conversation(participants_key=key) for _, _, key in pairs
+    ])
+    Membership = models.Conversation.users.through
+    Membership.objects.bulk_create([
+        Membership(conversation_id=conversation.pk, customuser_id=user.pk)
+        for conversation, (a, b, _) in zip(conversation_objs, pairs)
+        for user in (a, b)
+    ], batch_size=500)
+
+    started = now()
+    for conversation, (a, b, _) in zip(conversation_objs, pairs):
+        models.Message.objects.bulk_create([
+            models.Message(conversation=conversation, user=rng.choice((a, b)), body=f'پیام آزمایشی شماره {i}')
+            for i in range(messages)
+        ], batch_size=500)
+        ids = list(conversation.conversation_messages.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), MESSAGES_PER_DAY):
+            chunk = ids[start:start + MESSAGES_PER_DAY]
+            created_at = started - datetime.timedelta(days=(len(ids) - start) // MESSAGES_PER_DAY)
+            models.Message.objects.filter(pk__in=chunk).update(created_at=created_at)
+    models.ReadState.objects.rebuild()
+
+    today = jalali.JalaliDate.today()
+    for n in range(activities):
+        start = jalali.JalaliDate.from_gregorian(datetime.date.today() - datetime.timedelta(days=rng.randint(0, 20)))
+        models.Activity.objects.bulk_assign(
+            [employee.pk for employee in employees],
+            creater_id=super_admin.pk,
+            title=f'فعالیت آزمایشی {n}',
+            body='benchmark',
+            start_date=start,
+            start_time=datetime.time(8, 0),
+            end_date=today,
+            end_time=datetime.time(17, 0),
+            sensitivity=str(1 + n % 3),
+            visibility=True,
+        )
+
+    return {
+        'super_admin': super_admin,
+        'manager': pairs[0][1],
+        'employee': pairs[0][0],
+        'employees': employees,
+        'conversation': conversation_objs[0],
+    }
+
+# --- scenarios ---
+
+def client_for(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+def build_scenarios(data, bulk_users=50):
+    conversation = data['conversation']
+    last_id = conversation.conversation_messages.order_by('-pk').values_list('pk', flat=True).first() or 0
+    bulk_user_ids = [user.pk for user in data['employees'][:bulk_users]]
+    clients = {role: client_for(data[role]) for role in ('super_admin', 'manager', 'employee')}
+    today = jalali.JalaliDate.today()
+    days = [datetime.date(2000, 1, 1) + datetime.timedelta(days=i) for i in range(10000)]
+    batch_days = jalali.np.array(days, dtype='datetime64[D]') if jalali.np is not None else days
+
+    def get(role, name, query='', **kwargs):
+        url = reverse(name, kwargs=kwargs) + query
+        return lambda: clients[role].get(url)
+
+    def bulk_activity():
+        return clients['super_admin'].post(reverse('super_admin_add_activity'), {
+            'users': bulk_user_ids,
+            'title': 'benchmark',
+            'body': 'benchmark',
+            'start_date': str(today),
+            'start_time': '08:00',
+            'end_date': str(today),
+            'end_time': '17:00',
+            'sensitivity': '1',
+        })
+
+    def jalali_single():
+        for day in days:
+            jalali.Gregorian(day).persian_tuple()
+
+    def jalali_batch():
+        jalali.to_persian_many(batch_days)
+
+    return {
+        'chat_open': get('employee', 'chat', pk=conversation.pk),
+        'chat_update': get('employee', 'update_chat', f'?after_id={max(last_id - 5, 0)}', pk=conversation.pk),
+        'chat_history': get('employee', 'message_history', f'?before_id={last_id}', pk=conversation.pk),
+        'tickets_super_admin': get('super_admin', 'super_admin_tickets'),
+        'tickets_manager': get('manager', 'manager_tickets'),
+        'tickets_employee': get('employee', 'employee_tickets'),
+        'dashboard_super_admin': get('super_admin', 'super_admin_dashboard'),
+        'dashboard_manager': get('manager', 'manager_dashboard'),
+        'dashboard_employee': get('employee', 'employee_dashboard'),
+        'bulk_activity_create': bulk_activity,
+        'jalali_convert_10k': jalali_single,
+        'jalali_batch_10k': jalali_batch,
+    }
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    if len(samples) == 1:
+        return samples[0]
+    position = (len(samples) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
+
+def measure(func, repeat=20, warmup=1):
+    for _ in range(warmup):
+        func()
+
+    timings, queries, statuses = [], [], set()
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = func()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        if response is not None:
+            statuses.add(response.status_code)
+
+    return {
+        'repeat': repeat,
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p90_ms': round(percentile(timings, 90), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': {'min': min(queries), 'max': max(queries), 'mean': round(statistics.fmean(queries), 2)},
+        'status_codes': sorted(statuses),
+    }
+
+def payload(func):
+    # حجم بدنه پاسخ قبل و بعد از فشرده سازی
+    content = func().content
+    sizes = {'bytes': len(content), 'gzip_bytes': len(gzip.compress(content))}
+    if middleware.brotli is not None:
+        sizes['brotli_bytes'] = len(middleware.brotli.compress(content, quality=settings.BROTLI_QUALITY))
+    return sizes
+
+def run(sizes, repeat=20, warmup=1, only=None, bulk_users=50, seed_value=0, log=None):
+    data = seed(rng=random.Random(seed_value), **sizes)
+    scenarios = build_scenarios(data, bulk_users=bulk_users)
+
+    results = {}
+    for name, func in scenarios.items():
+        if only and name not in only:
+            continue
+        results[name] = measure(func, repeat=repeat, warmup=warmup)
+        if name in PAYLOAD_SCENARIOS:
+            results[name]['payload'] = payload(func)
+        if log:
+            log(name, results[name])
+
+    return {
+        'meta': {
+            'created_at': now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'numpy': jalali.np is not None,
+            'sizes': sizes,
+            'repeat': repeat,
+            'warmup': warmup,
+            'seed': seed_value,
+            'bulk_users': bulk_users,
+            'background_threshold': settings.BULK_ACTIVITY_BACKGROUND_THRESHOLD,
+        },
+        'scenarios': results,
+    }
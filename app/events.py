@@ -0,0 +1,30 @@
+import asyncio
+from django.conf import settings
+from .models import Conversation
+
+# نسخه هر تیکت فقط در ستون Conversation.version نگهداری می شود؛ درخواست های long-poll همان ستون را
+# با یک کوئری روی کلید اصلی می خوانند، پس همه پردازه ها بدون کش مشترک یک مقدار را می بینند.
+
+def get_version(conversation_id):
+    return Conversation.objects.filter(pk=conversation_id).values_list('version', flat=True).first() or 0
+
+def notify(conversation_id):
+    # داخل تراکنش تغییر صدا زده شود تا نسخه همراه با خود تغییر commit شود
+    Conversation.objects.bump_version(conversation_id)
+
+async def wait_for_change(conversation_id, version, timeout=None):
+    if timeout is None:
+        timeout = settings.CHAT_PUSH_TIMEOUT
+    interval = settings.CHAT_PUSH_INTERVAL
+    versions = Conversation.objects.filter(pk=conversation_id).values_list('version', flat=True)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        current = await versions.afirst() or 0
+        if current != version:
+            return current
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return current
+        await asyncio.sleep(min(interval, remaining))
@@ -0,0 +1,77 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+from .jalali import JalaliDate
+
+# تاریخ شمسی به صورت عدد YYYYMMDD ذخیره می شود تا مرتب سازی و بازه ها در خود دیتابیس درست باشند.
+
+class JalaliDateFormField(forms.CharField):
+    widget = forms.TextInput(attrs={'data-jdp': '', 'autocomplete': 'off'})
+    default_error_messages = {
+        'invalid': 'تاریخ باید به صورت 1404/01/01 و معتبر باشد.',
+    }
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if value in self.empty_values:
+            return None
+        try:
+            return JalaliDate.parse(value)
+        except ValueError:
+            raise ValidationError(self.error_messages['invalid'], code='invalid')
+
+    def prepare_value(self, value):
+        return str(value) if isinstance(value, JalaliDate) else value
+
+class JalaliDateField(models.Field):
+    description = 'تاریخ شمسی'
+    default_error_messages = {
+        'invalid': '«%(value)s» تاریخ شمسی معتبر نیست.',
+    }
+
+    def get_internal_type(self):
+        return 'IntegerField'
+
+    def to_python(self, value):
+        if value is None or value == '':
+            return None
+        try:
+            return JalaliDate.parse(value)
+        except ValueError:
+            raise ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else JalaliDate.from_int(value)
+
+    def get_prep_value(self, value):
+        value = self.to_python(super().get_prep_value(value))
+        return None if value is None else value.as_int
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return '' if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': JalaliDateFormField, **kwargs})
+
+class JalaliTransform(models.Transform):
+    output_field = models.IntegerField()
+
+    def as_sql(self, compiler, connection):
+        lhs, params = compiler.compile(self.lhs)
+        return self.template % {'lhs': lhs}, tuple(params) * self.template.count('%(lhs)s')
+
+@JalaliDateField.register_lookup
+class JalaliYear(JalaliTransform):
+    lookup_name = 'year'
+    template = '(%(lhs)s / 10000)'
+
+@JalaliDateField.register_lookup
+class JalaliMonth(JalaliTransform):
+    lookup_name = 'month'
+    template = '((%(lhs)s / 100) - (%(lhs)s / 10000) * 100)'
+
+@JalaliDateField.register_lookup
+class JalaliDay(JalaliTransform):
+    lookup_name = 'day'
+    template = '(%(lhs)s - (%(lhs)s / 100) * 100)'
@@ -1,8 +1,8 @@
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
-from django.db.models import Q
 from . import models
+from .fields import JalaliDateFormField
 
 CustomUser = get_user_model()
 
@@ -87,9 +87,9 @@ class SuperAdminBulkActivityForm(forms.Form):
     )
     title = forms.CharField(max_length=1000, label='عنوان', widget=forms.TextInput(attrs=attrs))
     body = forms.CharField(label='توضیحات', widget=forms.Textarea(attrs=attrs))
-    start_date = forms.CharField(label='تاریخ شروع', widget=forms.TextInput(attrs={**attrs, 'data-jdp': '', 'autocomplete': 'off'}))
+    start_date = JalaliDateFormField(label='تاریخ شروع', widget=forms.TextInput(attrs={**attrs, 'data-jdp': '', 'autocomplete': 'off'}))
     start_time = forms.TimeField(label='ساعت شروع', widget=forms.TimeInput(attrs={**attrs, 'type': 'time'}))
-    end_date = forms.CharField(label='تاریخ پایان', widget=forms.TextInput(attrs={**attrs, 'data-jdp': '', 'autocomplete': 'off'}))
+    end_date = JalaliDateFormField(label='تاریخ پایان', widget=forms.TextInput(attrs={**attrs, 'data-jdp': '', 'autocomplete': 'off'}))
     end_time = forms.TimeField(label='ساعت پایان', widget=forms.TimeInput(attrs={**attrs, 'type': 'time'}))
     sensitivity = forms.ChoiceField(choices=models.Activity.SENSITIVITY_CHOICES, label='حساسیت', widget=forms.Select(attrs=attrs))
 
@@ -101,9 +101,9 @@ class ManagerBulkActivityForm(forms.Form):
     )
     title = forms.CharField(max_length=1000, label='عنوان', widget=forms.TextInput(attrs=attrs))
     body = forms.CharField(label='توضیحات', widget=forms.Textarea(attrs=attrs))
-    start_date = forms.CharField(label='تاریخ شروع', widget=forms.TextInput(attrs={**attrs, 'data-jdp': '', 'autocomplete': 'off'}))
+    start_date = JalaliDateFormField(label='تاریخ شروع', widget=forms.TextInput(attrs={**attrs, 'data-jdp': '', 'autocomplete': 'off'}))
     start_time = forms.TimeField(label='ساعت شروع', widget=forms.TimeInput(attrs={**attrs, 'type': 'time'}))
-    end_date = forms.CharField(label='تاریخ پایان', widget=forms.TextInput(attrs={**attrs, 'data-jdp': '', 'autocomplete': 'off'}))
+    end_date = JalaliDateFormField(label='تاریخ پایان', widget=forms.TextInput(attrs={**attrs, 'data-jdp': '', 'autocomplete': 'off'}))
     end_time = forms.TimeField(label='ساعت پایان', widget=forms.TimeInput(attrs={**attrs, 'type': 'time'}))
     sensitivity = forms.ChoiceField(choices=models.Activity.SENSITIVITY_CHOICES, label='حساسیت', widget=forms.Select(attrs=attrs))
 
@@ -111,11 +111,7 @@ class ManagerBulkActivityForm(forms.Form):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         if user is not None:
-            self.fields['users'].queryset = CustomUser.objects.filter(
-                manager=user,
-                user_type='3',
-                user_profile__status='2'
-            )
+            self.fields['users'].queryset = CustomUser.objects.team_of(user)
 
 class ActivityUpdateForm(forms.ModelForm):
     class Meta:
@@ -155,7 +151,7 @@ class SuperAdminTicketCreateForm(forms.Form):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         if user is not None:
-            self.fields['user'].queryset = CustomUser.objects.all().exclude(id=user.id)
+            self.fields['user'].queryset = CustomUser.objects.ticket_contacts_of(user)
 
 class ManagerTicketCreateForm(forms.Form):
     user = forms.ModelChoiceField(
@@ -168,9 +164,7 @@ class ManagerTicketCreateForm(forms.Form):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         if user is not None:
-            self.fields['user'].queryset = CustomUser.objects.filter(
-                Q(manager=user, user_type='3', user_profile__status='2') | Q(user_type='1')
-            )
+            self.fields['user'].queryset = CustomUser.objects.ticket_contacts_of(user)
 
 class EmployeeTicketCreateForm(forms.Form):
     user = forms.ModelChoiceField(
@@ -183,14 +177,7 @@ class EmployeeTicketCreateForm(forms.Form):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         if user is not None:
-            manager = user.manager
-
-            if manager:
-                self.fields['user'].queryset = models.CustomUser.objects.filter(
-                    Q(user_type='1') | Q(id=manager.id)
-                )
-            else:
-                self.fields['user'].queryset = models.CustomUser.objects.filter(user_type='1')
+            self.fields['user'].queryset = models.CustomUser.objects.ticket_contacts_of(user)
 
 class ChatCreateForm(forms.ModelForm):
     class Meta:
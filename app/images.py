@@ -0,0 +1,62 @@
+import os
+from io import BytesIO
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# نسخه های کوچک شده تصاویر پروفایل؛ اصل تصویر فقط برای دانلود نگه داشته می شود.
+
+DERIVATIVE_SIZES = {
+    'thumbnail': (600, 600),
+    'web': (1600, 1600),
+}
+
+IMAGE_FIELDS = ('national_card', 'guarantee')
+
+def derivative_field(field_name, derivative):
+    return f'{field_name}_{derivative}'
+
+def derivative_files(profile_id, field_names):
+    """Stored derivatives of ``field_names`` as ``(storage, name)`` pairs, read from the database row."""
+    from .models import Profile
+
+    columns = [derivative_field(field_name, derivative) for field_name in field_names for derivative in DERIVATIVE_SIZES]
+    row = Profile.objects.filter(pk=profile_id).values(*columns).first() or {}
+    return [(Profile._meta.get_field(column).storage, name) for column, name in row.items() if name]
+
+def delete_files(files):
+    for storage, name in files:
+        storage.delete(name)
+
+def render_derivative(image, size):
+    copy = image.copy()
+    copy.thumbnail(size, Image.Resampling.LANCZOS)
+    output = BytesIO()
+    # ذخیره بدون exif تا اطلاعات مکان و دستگاه حذف شود
+    copy.save(output, format='JPEG', quality=82, optimize=True, progressive=True)
+    return ContentFile(output.getvalue())
+
+def build_profile_derivatives(profile_id, field_name):
+    from .models import Profile
+
+    profile = Profile.objects.filter(pk=profile_id).first()
+    if profile is None:
+        return
+    original = getattr(profile, field_name)
+    if not original:
+        return
+
+    with original.open('rb') as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    stem = os.path.splitext(os.path.basename(original.name))[0]
+    updates = {}
+    for derivative, size in DERIVATIVE_SIZES.items():
+        field = getattr(profile, derivative_field(field_name, derivative))
+        field.save(f'{stem}_{derivative}.jpg', render_derivative(image, size), save=False)
+        updates[derivative_field(field_name, derivative)] = field.name
+
+    # اگر در این فاصله تصویر اصلی عوض شده باشد، نسخه های ساخته شده کنار گذاشته می شوند
+    if not Profile.objects.filter(pk=profile_id, **{field_name: original.name}).update(**updates):
+        for derivative in DERIVATIVE_SIZES:
+            getattr(profile, derivative_field(field_name, derivative)).delete(save=False)
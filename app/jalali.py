@@ -1,76 +1,188 @@
 import re
 import datetime
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# تبدیل تاریخ با جدول روز شروع هر سال شمسی (بر حسب date.toordinal) در بازه MIN_YEAR تا MAX_YEAR
+# (میلادی 1831 تا 2199). جدول یک بار از همان فرمول قبلی ساخته می شود و خارج از بازه تبدیل به خود فرمول برمی گردد.
+
+MIN_YEAR = 1210
+MAX_YEAR = 1577
+
+DATE_PATTERN = re.compile(r'^(\d{4})\D(\d{1,2})\D(\d{1,2})$')
+MONTH_OFFSETS = (0, 0, 31, 62, 93, 124, 155, 186, 216, 246, 276, 306, 336)
+EPOCH_DAY_NUMBER = datetime.date(1970, 1, 1).toordinal()
+
+
+class JalaliError(ValueError):
+    pass
+
+
+@functools.lru_cache(maxsize=4096)
+def parse(value):
+    m = DATE_PATTERN.match(value)
+    if not m:
+        raise JalaliError("Invalid Input String")
+    return int(m.group(1)), int(m.group(2)), int(m.group(3))
+
+
+def _formula_to_persian(year, month, day):
+    d_4 = year % 4
+    g_a = [0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+    doy_g = g_a[month] + day
+    if d_4 == 0 and month > 2:
+        doy_g += 1
+    d_33 = int(((year - 16) % 132) * .0305)
+    a = 286 if (d_33 == 3 or d_33 < (d_4 - 1) or d_4 == 0) else 287
+    if (d_33 == 1 or d_33 == 2) and (d_33 == d_4 or d_4 == 1):
+        b = 78
+    else:
+        b = 80 if (d_33 == 3 and d_4 == 0) else 79
+    if int((year - 10) / 63) == 30:
+        a -= 1
+        b += 1
+    if doy_g > b:
+        jy = year - 621
+        doy_j = doy_g - b
+    else:
+        jy = year - 622
+        doy_j = doy_g + a
+    if doy_j < 187:
+        jm = int((doy_j - 1) / 31)
+        jd = doy_j - (31 * jm)
+        jm += 1
+    else:
+        jm = int((doy_j - 187) / 30)
+        jd = doy_j - 186 - (jm * 30)
+        jm += 7
+    return jy, jm, jd
+
+
+def _formula_to_gregorian(year, month, day):
+    d_4 = (year + 1) % 4
+    if month < 7:
+        doy_j = ((month - 1) * 31) + day
+    else:
+        doy_j = ((month - 7) * 30) + day + 186
+    d_33 = int(((year - 55) % 132) * .0305)
+    a = 287 if (d_33 != 3 and d_4 <= d_33) else 286
+    if (d_33 == 1 or d_33 == 2) and (d_33 == d_4 or d_4 == 1):
+        b = 78
+    else:
+        b = 80 if (d_33 == 3 and d_4 == 0) else 79
+    if int((year - 19) / 63) == 20:
+        a -= 1
+        b += 1
+    if doy_j <= a:
+        gy = year + 621
+        gd = doy_j + b
+    else:
+        gy = year + 622
+        gd = doy_j - a
+    for gm, v in enumerate([0, 31, 29 if (gy % 4 == 0) else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]):
+        if gd <= v:
+            break
+        gd -= v
+    return gy, gm, gd
+
+
+def _build_year_starts():
+    starts = []
+    for year in range(MIN_YEAR, MAX_YEAR + 2):
+        day = datetime.date(year + 621, 3, 18)
+        while _formula_to_persian(day.year, day.month, day.day) != (year, 1, 1):
+            day += datetime.timedelta(days=1)
+        starts.append(day.toordinal())
+    return tuple(starts)
+
+
+YEAR_STARTS = _build_year_starts()
+FIRST_DAY_NUMBER = YEAR_STARTS[0]
+LAST_DAY_NUMBER = YEAR_STARTS[-1]
+YEAR_STARTS_ARRAY = np.asarray(YEAR_STARTS, dtype=np.int64) if np is not None else None
+
+
+def day_number(year, month, day):
+    """Jalali date -> ``date.toordinal()`` of the same day."""
+    if MIN_YEAR <= year <= MAX_YEAR:
+        return YEAR_STARTS[year - MIN_YEAR] + MONTH_OFFSETS[month] + day - 1
+    return datetime.date(*_formula_to_gregorian(year, month, day)).toordinal()
+
+
+def _split_day_of_year(day_of_year):
+    if day_of_year < 186:
+        return day_of_year // 31 + 1, day_of_year % 31 + 1
+    return (day_of_year - 186) // 30 + 7, (day_of_year - 186) % 30 + 1
+
+
+def from_day_number(number):
+    """``date.toordinal()`` -> Jalali (year, month, day)."""
+    if not FIRST_DAY_NUMBER <= number < LAST_DAY_NUMBER:
+        date = datetime.date.fromordinal(number)
+        return _formula_to_persian(date.year, date.month, date.day)
+    # یک دوره ۳۳ ساله ۱۲۰۵۳ روز است؛ تخمین حداکثر یک سال خطا دارد
+    index = (number - FIRST_DAY_NUMBER) * 33 // 12053
+    while YEAR_STARTS[index] > number:
+        index -= 1
+    while YEAR_STARTS[index + 1] <= number:
+        index += 1
+    return (MIN_YEAR + index, *_split_day_of_year(number - YEAR_STARTS[index]))
+
+
+def is_leap(year):
+    if MIN_YEAR <= year <= MAX_YEAR:
+        return YEAR_STARTS[year + 1 - MIN_YEAR] - YEAR_STARTS[year - MIN_YEAR] == 366
+    return from_day_number(day_number(year, 12, 30)) == (year, 12, 30)
+
+
+def month_length(year, month):
+    if month <= 6:
+        return 31
+    if month <= 11:
+        return 30
+    return 30 if is_leap(year) else 29
+
+
+def _date_tuple(date):
+    if isinstance(date, str):
+        return parse(date)
+    if isinstance(date, tuple):
+        year, month, day = date
+        return int(year), int(month), int(day)
+    raise JalaliError("Invalid Input Type")
+
 
 class Gregorian:
 
     def __init__(self, *date):
-        # Parse date
         if len(date) == 1:
             date = date[0]
-            if type(date) is str:
-                m = re.match(r'^(\d{4})\D(\d{1,2})\D(\d{1,2})$', date)
-                if m:
-                    [year, month, day] = [int(m.group(1)), int(m.group(2)), int(m.group(3))]
-                else:
-                    raise Exception("Invalid Input String")
-            elif type(date) is datetime.date:
-                [year, month, day] = [date.year, date.month, date.day]
-            elif type(date) is tuple:
-                year, month, day = date
-                year = int(year)
-                month = int(month)
-                day = int(day)
+            if isinstance(date, datetime.date):
+                number = date.toordinal()
+                year, month, day = date.year, date.month, date.day
             else:
-                raise Exception("Invalid Input Type")
+                year, month, day = _date_tuple(date)
+                number = None
         elif len(date) == 3:
-            year = int(date[0])
-            month = int(date[1])
-            day = int(date[2])
+            year, month, day = int(date[0]), int(date[1]), int(date[2])
+            number = None
         else:
-            raise Exception("Invalid Input")
+            raise JalaliError("Invalid Input")
 
-        # Check the validity of input date
-        try:
-            datetime.datetime(year, month, day)
-        except:
-            raise Exception("Invalid Date")
+        if number is None:
+            try:
+                number = datetime.date(year, month, day).toordinal()
+            except ValueError:
+                raise JalaliError("Invalid Date")
 
         self.gregorian_year = year
         self.gregorian_month = month
         self.gregorian_day = day
-
-        # Convert date to Jalali
-        d_4 = year % 4
-        g_a = [0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
-        doy_g = g_a[month] + day
-        if d_4 == 0 and month > 2:
-            doy_g += 1
-        d_33 = int(((year - 16) % 132) * .0305)
-        a = 286 if (d_33 == 3 or d_33 < (d_4 - 1) or d_4 == 0) else 287
-        if (d_33 == 1 or d_33 == 2) and (d_33 == d_4 or d_4 == 1):
-            b = 78
-        else:
-            b = 80 if (d_33 == 3 and d_4 == 0) else 79
-        if int((year - 10) / 63) == 30:
-            a -= 1
-            b += 1
-        if doy_g > b:
-            jy = year - 621
-            doy_j = doy_g - b
-        else:
-            jy = year - 622
-            doy_j = doy_g + a
-        if doy_j < 187:
-            jm = int((doy_j - 1) / 31)
-            jd = doy_j - (31 * jm)
-            jm += 1
-        else:
-            jm = int((doy_j - 187) / 30)
-            jd = doy_j - 186 - (jm * 30)
-            jm += 7
-        self.persian_year = jy
-        self.persian_month = jm
-        self.persian_day = jd
+        self.persian_year, self.persian_month, self.persian_day = from_day_number(number)
 
     def persian_tuple(self):
         return self.persian_year, self.persian_month, self.persian_day
@@ -82,66 +194,25 @@ class Gregorian:
 class Persian:
 
     def __init__(self, *date):
-        # Parse date
         if len(date) == 1:
-            date = date[0]
-            if type(date) is str:
-                m = re.match(r'^(\d{4})\D(\d{1,2})\D(\d{1,2})$', date)
-                if m:
-                    [year, month, day] = [int(m.group(1)), int(m.group(2)), int(m.group(3))]
-                else:
-                    raise Exception("Invalid Input String")
-            elif type(date) is tuple:
-                year, month, day = date
-                year = int(year)
-                month = int(month)
-                day = int(day)
-            else:
-                raise Exception("Invalid Input Type")
+            year, month, day = _date_tuple(date[0])
         elif len(date) == 3:
-            year = int(date[0])
-            month = int(date[1])
-            day = int(date[2])
+            year, month, day = int(date[0]), int(date[1]), int(date[2])
         else:
-            raise Exception("Invalid Input")
+            raise JalaliError("Invalid Input")
 
-        # Check validity of date. TODO better check (leap years)
+        # همان بررسی قبلی؛ ۳۰ اسفند سال غیر کبیسه به اول فروردین سال بعد تبدیل می شود
         if year < 1 or month < 1 or month > 12 or day < 1 or day > 31 or (month > 6 and day == 31):
-            raise Exception("Incorrect Date")
+            raise JalaliError("Incorrect Date")
 
         self.persian_year = year
         self.persian_month = month
         self.persian_day = day
 
-        # Convert date
-        d_4 = (year + 1) % 4
-        if month < 7:
-            doy_j = ((month - 1) * 31) + day
-        else:
-            doy_j = ((month - 7) * 30) + day + 186
-        d_33 = int(((year - 55) % 132) * .0305)
-        a = 287 if (d_33 != 3 and d_4 <= d_33) else 286
-        if (d_33 == 1 or d_33 == 2) and (d_33 == d_4 or d_4 == 1):
-            b = 78
-        else:
-            b = 80 if (d_33 == 3 and d_4 == 0) else 79
-        if int((year - 19) / 63) == 20:
-            a -= 1
-            b += 1
-        if doy_j <= a:
-            gy = year + 621
-            gd = doy_j + b
-        else:
-            gy = year + 622
-            gd = doy_j - a
-        for gm, v in enumerate([0, 31, 29 if (gy % 4 == 0) else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]):
-            if gd <= v:
-                break
-            gd -= v
-
-        self.gregorian_year = gy
-        self.gregorian_month = gm
-        self.gregorian_day = gd
+        date = datetime.date.fromordinal(day_number(year, month, day))
+        self.gregorian_year = date.year
+        self.gregorian_month = date.month
+        self.gregorian_day = date.day
 
     def gregorian_tuple(self):
         return self.gregorian_year, self.gregorian_month, self.gregorian_day
@@ -150,4 +221,139 @@ class Persian:
         return date_format.format(self.gregorian_year, self.gregorian_month, self.gregorian_day)
 
     def gregorian_datetime(self):
-        return datetime.date(self.gregorian_year, self.gregorian_month, self.gregorian_day)
\ No newline at end of file
+        return datetime.date(self.gregorian_year, self.gregorian_month, self.gregorian_day)
+
+
+# --- batch ---
+
+def to_persian_many(dates):
+    """
+    Converts many Gregorian dates at once.
+
+    A list of ``datetime.date`` gives a list of (year, month, day) tuples; a NumPy
+    ``datetime64`` array gives an ``(n, 3)`` integer array.
+    """
+    if np is not None and isinstance(dates, np.ndarray):
+        return _to_persian_array(dates)
+    return [from_day_number(date.toordinal()) for date in dates]
+
+
+def to_gregorian_many(dates):
+    """
+    Converts many Jalali dates at once.
+
+    A list of strings, tuples or ``JalaliDate`` gives a list of ``datetime.date``; an
+    ``(n, 3)`` NumPy integer array gives a ``datetime64[D]`` array.
+    """
+    if np is not None and isinstance(dates, np.ndarray):
+        return _to_gregorian_array(dates)
+    result = []
+    for date in dates:
+        year, month, day = (date.year, date.month, date.day) if isinstance(date, JalaliDate) else _date_tuple(date)
+        result.append(datetime.date.fromordinal(day_number(year, month, day)))
+    return result
+
+
+def _to_persian_array(dates):
+    numbers = dates.astype('datetime64[D]').astype(np.int64) + EPOCH_DAY_NUMBER
+    result = np.empty((len(numbers), 3), dtype=np.int64)
+
+    inside = (numbers >= FIRST_DAY_NUMBER) & (numbers < LAST_DAY_NUMBER)
+    index = np.searchsorted(YEAR_STARTS_ARRAY, numbers[inside], side='right') - 1
+    day_of_year = numbers[inside] - YEAR_STARTS_ARRAY[index]
+    first_half = day_of_year < 186
+    second_half = np.maximum(day_of_year - 186, 0)
+    result[inside, 0] = MIN_YEAR + index
+    result[inside, 1] = np.where(first_half, day_of_year // 31 + 1, second_half // 30 + 7)
+    result[inside, 2] = np.where(first_half, day_of_year % 31 + 1, second_half % 30 + 1)
+
+    for position in np.flatnonzero(~inside):
+        result[position] = from_day_number(int(numbers[position]))
+    return result
+
+
+def _to_gregorian_array(dates):
+    dates = np.asarray(dates, dtype=np.int64).reshape(-1, 3)
+    years, months, days = dates[:, 0], dates[:, 1], dates[:, 2]
+    numbers = np.empty(len(dates), dtype=np.int64)
+
+    inside = (years >= MIN_YEAR) & (years <= MAX_YEAR)
+    offsets = np.asarray(MONTH_OFFSETS, dtype=np.int64)
+    numbers[inside] = YEAR_STARTS_ARRAY[years[inside] - MIN_YEAR] + offsets[months[inside]] + days[inside] - 1
+
+    for position in np.flatnonzero(~inside):
+        numbers[position] = day_number(*(int(part) for part in dates[position]))
+    return (numbers - EPOCH_DAY_NUMBER).astype('datetime64[D]')
+
+
+@functools.total_ordering
+class JalaliDate:
+    """Immutable Jalali calendar date; ``as_int`` is the sortable integer YYYYMMDD."""
+
+    __slots__ = ('year', 'month', 'day')
+
+    def __init__(self, year, month, day):
+        year, month, day = int(year), int(month), int(day)
+        if not 1 <= month <= 12 or not 1 <= day <= month_length(year, month):
+            raise JalaliError("Invalid Date")
+        object.__setattr__(self, 'year', year)
+        object.__setattr__(self, 'month', month)
+        object.__setattr__(self, 'day', day)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("JalaliDate is immutable")
+
+    def __reduce__(self):
+        # copy/pickle (کش، داده آزمون) از سازنده استفاده می کنند چون __setattr__ بسته است
+        return type(self), (self.year, self.month, self.day)
+
+    @classmethod
+    def parse(cls, value):
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, int):
+            return cls.from_int(value)
+        if isinstance(value, datetime.date):
+            return cls.from_gregorian(value)
+        if isinstance(value, str):
+            return cls(*parse(value.strip()))
+        raise JalaliError("Invalid Input")
+
+    @classmethod
+    def from_int(cls, value):
+        return cls(value // 10000, value // 100 % 100, value % 100)
+
+    @classmethod
+    def from_gregorian(cls, date):
+        return cls(*from_day_number(date.toordinal()))
+
+    @classmethod
+    def today(cls):
+        return cls.from_gregorian(datetime.date.today())
+
+    @property
+    def as_int(self):
+        return self.year * 10000 + self.month * 100 + self.day
+
+    def to_gregorian(self):
+        return datetime.date.fromordinal(day_number(self.year, self.month, self.day))
+
+    def __eq__(self, other):
+        if not isinstance(other, JalaliDate):
+            return NotImplemented
+        return self.as_int == other.as_int
+
+    def __lt__(self, other):
+        if not isinstance(other, JalaliDate):
+            return NotImplemented
+        return self.as_int < other.as_int
+
+    def __hash__(self):
+        return hash(self.as_int)
+
+    def __repr__(self):
+        return f"JalaliDate({self.year}, {self.month}, {self.day})"
+
+    def __str__(self):
+        return f"{self.year:04d}/{self.month:02d}/{self.day:02d}"
+
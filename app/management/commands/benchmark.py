@@ -0,0 +1,51 @@
+import json
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from app import benchmark
+
+class Command(BaseCommand):
+    help = 'داده مصنوعی را در یک دیتابیس تست می سازد، سناریوهای پرتکرار را زمان گیری می کند و نتیجه را به صورت JSON می نویسد.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='تعداد کارمندان')
+        parser.add_argument('--managers', type=int, default=5, help='تعداد مدیران')
+        parser.add_argument('--conversations', type=int, default=30, help='تعداد تیکت ها')
+        parser.add_argument('--messages', type=int, default=100, help='تعداد پیام های هر تیکت')
+        parser.add_argument('--activities', type=int, default=5, help='تعداد فعالیت های هر کارمند')
+        parser.add_argument('--bulk-users', type=int, default=50, help='تعداد کاربران در سناریوی ساخت گروهی فعالیت')
+        parser.add_argument('--repeat', type=int, default=20, help='تعداد اجرای هر سناریو')
+        parser.add_argument('--warmup', type=int, default=1, help='تعداد اجرای اولیه که اندازه گیری نمی شود')
+        parser.add_argument('--seed', type=int, default=0, help='seed تولید داده تصادفی')
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='فقط این سناریو (قابل تکرار)')
+        parser.add_argument('--output', '-o', help='مسیر فایل JSON خروجی؛ در غیر این صورت stdout')
+
+    def handle(self, *args, **options):
+        sizes = {key: options[key] for key in ('users', 'managers', 'conversations', 'messages', 'activities')}
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            result = benchmark.run(
+                sizes,
+                repeat=options['repeat'],
+                warmup=options['warmup'],
+                only=options['scenarios'],
+                bulk_users=options['bulk_users'],
+                seed_value=options['seed'],
+                log=self.log,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f'نتیجه در {options["output"]} نوشته شد.'))
+        else:
+            self.stdout.write(output)
+
+    def log(self, name, stats):
+        self.stderr.write(f'{name}: p50={stats["p50_ms"]}ms p95={stats["p95_ms"]}ms queries={stats["queries"]["max"]}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from app import models, images
+
+class Command(BaseCommand):
+    help = 'نسخه های کوچک شده تصاویر پروفایل هایی را که هنوز ساخته نشده اند تولید می کند.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='ساخت دوباره برای همه پروفایل ها')
+
+    def handle(self, *args, **options):
+        count = 0
+        for profile in models.Profile.objects.iterator():
+            for field in images.IMAGE_FIELDS:
+                if not getattr(profile, field):
+                    continue
+                if not options['all'] and getattr(profile, images.derivative_field(field, 'web')):
+                    continue
+                try:
+                    images.build_profile_derivatives(profile.pk, field)
+                    count += 1
+                except (OSError, ValueError) as error:
+                    self.stderr.write(f'پروفایل {profile.pk} ({field}): {error}')
+        self.stdout.write(self.style.SUCCESS(f'{count} تصویر پردازش شد.'))
@@ -0,0 +1,49 @@
+import re
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils.timezone import now
+from app import models
+
+BLOB_NAME = re.compile(r'^message/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$')
+
+class Command(BaseCommand):
+    help = 'فایل های ضمیمه قدیمی پیام ها را به ساختار آدرس دهی بر اساس محتوا منتقل و شمارنده ارجاع آن ها را بازسازی می کند.'
+
+    def handle(self, *args, **options):
+        storage = models.Message._meta.get_field('file').storage
+        legacy_names = set()
+        moved = 0
+
+        messages = models.Message.objects.exclude(file='').exclude(file__isnull=True).only('id', 'file')
+        for message in messages.iterator():
+            name = message.file.name
+            if BLOB_NAME.match(name):
+                continue
+            if not storage.exists(name):
+                self.stderr.write(f'فایل پیام {message.id} پیدا نشد: {name}')
+                continue
+
+            with storage.open(name, 'rb') as content:
+                blob_name = storage.save(name, File(content))
+            models.Message.objects.filter(pk=message.pk).update(file=blob_name, updated_at=now())
+            legacy_names.add(name)
+            moved += 1
+
+        with transaction.atomic():
+            references = (
+                models.Message.objects.exclude(file='').exclude(file__isnull=True)
+                .values('file').annotate(ref_count=Count('id'))
+            )
+            models.FileBlob.objects.all().delete()
+            models.FileBlob.objects.bulk_create(
+                [models.FileBlob(name=row['file'], ref_count=row['ref_count']) for row in references],
+                batch_size=500,
+            )
+
+        for name in legacy_names:
+            if not models.Message.objects.filter(file=name).exists():
+                storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(f'{moved} فایل منتقل شد.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app import models
+
+class Command(BaseCommand):
+    help = 'شمارنده پیام های خوانده نشده هر کاربر در هر تیکت را از ابتدا محاسبه می کند.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = models.ReadState.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{count} شمارنده بازسازی شد.'))
@@ -0,0 +1,41 @@
+import re
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# فشرده سازی پاسخ های متنی: brotli اگر نصب باشد و مرورگر بپذیرد، در غیر این صورت gzip جنگو.
+# فایل های ضمیمه و تصاویر از قبل فشرده اند و دست نخورده برمی گردند.
+
+ACCEPTS_BROTLI = re.compile(r'\bbr\b')
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if (
+            brotli is None
+            or response.streaming
+            or len(response.content) < 200
+            or response.has_header('Content-Encoding')
+            or not ACCEPTS_BROTLI.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_read_states(apps, schema_editor):
+    Conversation = apps.get_model('app', 'Conversation')
+    Message = apps.get_model('app', 'Message')
+    ReadState = apps.get_model('app', 'ReadState')
+
+    read_states = []
+    for conversation in Conversation.objects.prefetch_related('users'):
+        for user in conversation.users.all():
+            last_read = Message.objects.filter(
+                conversation=conversation, seen=True
+            ).exclude(user=user).aggregate(last=Max('id'))['last']
+            if last_read:
+                read_states.append(ReadState(user=user, conversation=conversation, last_read_message_id=last_read))
+
+    ReadState.objects.bulk_create(read_states, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_alter_message_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0, verbose_name='آخرین پیام خوانده شده')),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_read_states', to='app.conversation', verbose_name='تیکت')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_read_states', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'وضعیت خواندن',
+                'verbose_name_plural': 'وضعیت های خواندن',
+                'constraints': [models.UniqueConstraint(fields=('user', 'conversation'), name='unique_read_state')],
+            },
+        ),
+        migrations.RunPython(backfill_read_states, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='seen',
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+def backfill_unread_counts(apps, schema_editor):
+    Conversation = apps.get_model('app', 'Conversation')
+    Message = apps.get_model('app', 'Message')
+    ReadState = apps.get_model('app', 'ReadState')
+
+    read_states = []
+    for conversation in Conversation.objects.prefetch_related('users'):
+        last_reads = dict(
+            ReadState.objects.filter(conversation=conversation).values_list('user_id', 'last_read_message_id')
+        )
+        for user in conversation.users.all():
+            unread_count = Message.objects.filter(
+                conversation=conversation, id__gt=last_reads.get(user.id, 0)
+            ).exclude(user=user).count()
+            read_states.append(ReadState(user=user, conversation=conversation, unread_count=unread_count))
+
+    ReadState.objects.bulk_create(
+        read_states,
+        update_conflicts=True,
+        unique_fields=['user', 'conversation'],
+        update_fields=['unread_count'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_readstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='readstate',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='تعداد پیام های خوانده نشده'),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
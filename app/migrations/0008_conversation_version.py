@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_readstate_unread_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='نسخه'),
+        ),
+    ]
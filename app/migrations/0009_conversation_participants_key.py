@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:06
+
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def dedupe_direct_conversations(apps, schema_editor):
+    Conversation = apps.get_model('app', 'Conversation')
+    Message = apps.get_model('app', 'Message')
+    ReadState = apps.get_model('app', 'ReadState')
+
+    pairs = defaultdict(list)
+    for conversation in Conversation.objects.prefetch_related('users').order_by('id'):
+        user_ids = sorted(user.id for user in conversation.users.all())
+        if len(user_ids) == 2:
+            pairs[':'.join(str(pk) for pk in user_ids)].append(conversation)
+
+    for key, conversations in pairs.items():
+        kept, duplicates = conversations[0], conversations[1:]
+        if duplicates:
+            duplicate_ids = [conversation.id for conversation in duplicates]
+            Message.objects.filter(conversation_id__in=duplicate_ids).update(conversation=kept)
+            ReadState.objects.filter(conversation_id__in=duplicate_ids).delete()
+            Conversation.objects.filter(id__in=duplicate_ids).delete()
+
+            # مثل ReadState.objects.rebuild برای تیکت باقی مانده: هر عضو یک ردیف دارد و شمارنده از روی پیام های منتقل شده دوباره شمرده می شود
+            for user in kept.users.all():
+                read_state, _ = ReadState.objects.get_or_create(user=user, conversation=kept)
+                read_state.unread_count = Message.objects.filter(
+                    conversation=kept, id__gt=read_state.last_read_message_id
+                ).exclude(user_id=user.id).count()
+                read_state.save(update_fields=['unread_count'])
+
+        kept.participants_key = key
+        kept.save(update_fields=['participants_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_conversation_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='participants_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='کلید کاربران'),
+        ),
+        migrations.RunPython(dedupe_direct_conversations, migrations.RunPython.noop),
+    ]
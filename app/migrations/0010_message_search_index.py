@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:00
+
+from django.db import migrations
+from app.normalizer import normalize
+
+# DDL این مهاجرت ثابت است و به app.search وابسته نیست تا تغییرات بعدی آن ماژول رفتار این مهاجرت را عوض نکند.
+TABLE = 'app_message_fts'
+
+CREATE_INDEX = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(document, tokenize='unicode61')",
+    ],
+    'postgresql': [
+        f'CREATE TABLE IF NOT EXISTS {TABLE} (id bigint PRIMARY KEY, document tsvector NOT NULL)',
+        f'CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} USING GIN (document)',
+    ],
+}
+
+INSERT_DOCUMENT = {
+    'sqlite': f'INSERT INTO {TABLE} (rowid, document) VALUES (%s, %s)',
+    'postgresql': f"INSERT INTO {TABLE} (id, document) VALUES (%s, to_tsvector('simple', %s))",
+}
+
+BATCH_SIZE = 500
+
+
+def create_message_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_INDEX:
+        return
+    Message = apps.get_model('app', 'Message')
+
+    for sql in CREATE_INDEX[vendor]:
+        schema_editor.execute(sql)
+
+    rows = [(message.pk, normalize(message.body)) for message in Message.objects.only('id', 'body').iterator()]
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(INSERT_DOCUMENT[vendor], rows[start:start + BATCH_SIZE])
+
+
+def drop_message_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_INDEX:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_conversation_participants_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_message_index, drop_message_index),
+    ]
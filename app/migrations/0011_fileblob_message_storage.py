@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:08
+
+import app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_message_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='نام فایل')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='تعداد ارجاع')),
+            ],
+            options={
+                'verbose_name': 'فایل ذخیره شده',
+                'verbose_name_plural': 'فایل های ذخیره شده',
+            },
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=app.storage.ContentAddressedStorage(), upload_to='message/', verbose_name='فایل ضمیمه'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_fileblob_message_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='guarantee_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='derivatives/guarantee/', verbose_name='تصویر کوچک ضمانت نامه'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='guarantee_web',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='derivatives/guarantee/', verbose_name='تصویر وب ضمانت نامه'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='national_card_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='derivatives/national_card/', verbose_name='تصویر کوچک کارت ملی'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='national_card_web',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='derivatives/national_card/', verbose_name='تصویر وب کارت ملی'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:10
+
+import datetime
+from django.db import migrations, models
+from django.utils.timezone import make_aware
+from app import jalali
+
+
+def jalali_datetime(date, time):
+    try:
+        day = jalali.Persian(date).gregorian_datetime()
+    except Exception:
+        return None
+    return make_aware(datetime.datetime.combine(day, time))
+
+
+def backfill_activity_window(apps, schema_editor):
+    Activity = apps.get_model('app', 'Activity')
+
+    activities = []
+    for activity in Activity.objects.only('start_date', 'start_time', 'end_date', 'end_time').iterator():
+        activity.starts_at = jalali_datetime(activity.start_date, activity.start_time)
+        activity.ends_at = jalali_datetime(activity.end_date, activity.end_time)
+        activities.append(activity)
+    Activity.objects.bulk_update(activities, ['starts_at', 'ends_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_profile_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='زمان پایان'),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='زمان شروع'),
+        ),
+        migrations.RunPython(backfill_activity_window, migrations.RunPython.noop),
+    ]
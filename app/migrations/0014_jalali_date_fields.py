@@ -0,0 +1,77 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:12
+
+import logging
+import app.fields
+from django.db import migrations, models
+from app.jalali import JalaliDate
+
+logger = logging.getLogger(__name__)
+
+DATE_FIELDS = (
+    ('activity', 'start_date', 'تاریخ شروع', True),
+    ('activity', 'end_date', 'تاریخ پایان', True),
+    ('profile', 'birthdate', 'تاریخ تولد', False),
+)
+
+
+def copy_dates(source, target):
+    # تاریخ های نامعتبر قدیمی متوقف کننده نیستند؛ خالی می شوند و با هشدار در لاگ گزارش می شوند.
+    def copy(apps, schema_editor):
+        for model_name, name, _, _ in DATE_FIELDS:
+            Model = apps.get_model('app', model_name)
+            rows = []
+            for obj in Model.objects.only('pk', name + source).iterator():
+                value = getattr(obj, name + source)
+                if value is not None:
+                    try:
+                        value = JalaliDate.parse(value)
+                    except ValueError:
+                        logger.warning('%s %s: تاریخ «%s» در فیلد %s معتبر نیست و خالی شد.', model_name, obj.pk, value, name)
+                        value = None
+                if target == '':
+                    value = '' if value is None else str(value)
+                setattr(obj, name + target, value)
+                rows.append(obj)
+            Model.objects.bulk_update(rows, [name + target], batch_size=500)
+    return copy
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_activity_window'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name=name + '_int',
+                field=app.fields.JalaliDateField(null=True, verbose_name=verbose_name),
+            )
+            for model_name, name, verbose_name, _ in DATE_FIELDS
+        ],
+        # ستون های متنی قبل از حذف nullable می شوند تا برگشت مهاجرت روی داده موجود ممکن باشد.
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=models.CharField(max_length=10, null=True, verbose_name=verbose_name),
+            )
+            for model_name, name, verbose_name, _ in DATE_FIELDS
+        ],
+        migrations.RunPython(copy_dates('', '_int'), copy_dates('_int', '')),
+        *[migrations.RemoveField(model_name=model_name, name=name) for model_name, name, _, _ in DATE_FIELDS],
+        *[
+            migrations.RenameField(model_name=model_name, old_name=name + '_int', new_name=name)
+            for model_name, name, _, _ in DATE_FIELDS
+        ],
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=app.fields.JalaliDateField(db_index=db_index, null=True, verbose_name=verbose_name),
+            )
+            for model_name, name, verbose_name, db_index in DATE_FIELDS
+        ],
+    ]
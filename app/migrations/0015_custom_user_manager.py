@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:21
+
+import app.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_jalali_date_fields'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', app.models.CustomUserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:00
+
+from django.db import migrations
+from app.normalizer import normalize
+
+# DDL و ستون های ایندکس ها در خود مهاجرت ثابت شده اند تا به app.search وابسته نباشند.
+# در PostgreSQL ستون ها با وزن A، B، ... در یک tsvector کنار هم قرار می گیرند.
+INDEX_COLUMNS = {
+    'app_customuser_fts': ('full_name', 'username'),
+    'app_activity_fts': ('title',),
+}
+WEIGHTS = 'ABCD'
+BATCH_SIZE = 500
+
+
+def create_index(schema_editor, table):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        columns = ', '.join(INDEX_COLUMNS[table])
+        schema_editor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns}, tokenize='unicode61')")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'CREATE TABLE IF NOT EXISTS {table} (id bigint PRIMARY KEY, document tsvector NOT NULL)')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_document ON {table} USING GIN (document)')
+
+
+def index_rows(schema_editor, table, rows):
+    columns = INDEX_COLUMNS[table]
+    if schema_editor.connection.vendor == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(columns))
+        sql = f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES (%s, {placeholders})'
+    else:
+        document = ' || '.join(f"setweight(to_tsvector('simple', %s), '{weight}')" for weight in WEIGHTS[:len(columns)])
+        sql = f'INSERT INTO {table} (id, document) VALUES (%s, {document})'
+    rows = [(pk, *(normalize(text) for text in texts)) for pk, *texts in rows]
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(sql, rows[start:start + BATCH_SIZE])
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    CustomUser = apps.get_model('app', 'CustomUser')
+    Activity = apps.get_model('app', 'Activity')
+
+    create_index(schema_editor, 'app_customuser_fts')
+    index_rows(schema_editor, 'app_customuser_fts', [
+        (user.pk, f'{user.first_name} {user.last_name}', user.username)
+        for user in CustomUser.objects.only('id', 'first_name', 'last_name', 'username').iterator()
+    ])
+
+    create_index(schema_editor, 'app_activity_fts')
+    index_rows(schema_editor, 'app_activity_fts', [
+        (activity.pk, activity.title) for activity in Activity.objects.only('id', 'title').iterator()
+    ])
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS app_activity_fts')
+        schema_editor.execute('DROP TABLE IF EXISTS app_customuser_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_custom_user_manager'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
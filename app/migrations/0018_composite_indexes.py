@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_message_updated_at'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', 'visibility', '-id'], name='activity_user_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(condition=models.Q(('visibility', False)), fields=['creater'], name='activity_hidden_creater_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['manager', 'user_type'], name='user_manager_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'id'], name='message_conversation_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readstate',
+            index=models.Index(fields=['conversation', 'last_read_message_id'], name='read_state_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readstate',
+            index=models.Index(condition=models.Q(('unread_count__gt', 0)), fields=['user'], name='read_state_unread_idx'),
+        ),
+    ]
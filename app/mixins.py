@@ -1,10 +1,65 @@
-import datetime
 from functools import wraps
-from django.utils.timezone import now, make_aware
+from asgiref.sync import iscoroutinefunction
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponseForbidden
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from .models import Activity, Profile, CustomUser, Conversation, Message
-from . import jalali
+
+# هر شیء محافظت شده فقط یک بار در هر درخواست خوانده می شود و بین mixin ها، decorator ها و get_object مشترک است.
+# قواعد دسترسی فهرستی (visible_to، accessible_by، team_of) روی QuerySet ها هستند و get_scoped_object
+# همان ها را برای یک شیء به کار می برد. وقتی پروفایل متعلق به خود کاربر است روی request.user هم گذاشته می شود تا user_profile دوباره خوانده نشود.
+
+RELATED_FIELDS = {
+    Activity: ('user',),
+    CustomUser: ('user_profile',),
+}
+
+def get_request_object(request, model, pk):
+    objects = request.__dict__.setdefault('_request_objects', {})
+    key = (model, str(pk))
+    if key not in objects:
+        queryset = model.objects.select_related(*RELATED_FIELDS.get(model, ()))
+        objects[key] = get_object_or_404(queryset, pk=pk)
+    return objects[key]
+
+def get_scoped_object(request, queryset, pk, message):
+    """Loads ``pk`` through a permission-scoped queryset; a missing row is 404, a row outside the scope is forbidden."""
+    objects = request.__dict__.setdefault('_request_objects', {})
+    key = (queryset.model, str(pk))
+    if key in objects:
+        if not queryset.filter(pk=pk).exists():
+            raise PermissionDenied(message)
+        return objects[key]
+    try:
+        objects[key] = queryset.select_related(*RELATED_FIELDS.get(queryset.model, ())).get(pk=pk)
+    except queryset.model.DoesNotExist:
+        # کوئری دوم فقط در مسیر خطا اجرا می شود
+        if not queryset.model._default_manager.filter(pk=pk).exists():
+            raise Http404
+        raise PermissionDenied(message)
+    return objects[key]
+
+async def aget_scoped_object(request, queryset, pk, message):
+    objects = request.__dict__.setdefault('_request_objects', {})
+    key = (queryset.model, str(pk))
+    if key in objects:
+        if not await queryset.filter(pk=pk).aexists():
+            raise PermissionDenied(message)
+        return objects[key]
+    try:
+        objects[key] = await queryset.select_related(*RELATED_FIELDS.get(queryset.model, ())).aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        if not await queryset.model._default_manager.filter(pk=pk).aexists():
+            raise Http404
+        raise PermissionDenied(message)
+    return objects[key]
+
+# --- CBV ---
+class RequestObjectMixin:
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        return get_request_object(self.request, self.model, self.kwargs[self.pk_url_kwarg])
 
 # --- CBV ---
 class RoleRequiredMixin:
@@ -65,10 +120,10 @@ def dis_approved_profile_required(view_func):
     return _wrapped
 
 # --- CBV ---
-class EmployeeOwnerRequiredMixin:
+class EmployeeOwnerRequiredMixin(RequestObjectMixin):
     def dispatch(self, request, *args, **kwargs):
-        employee = CustomUser.objects.get(pk=kwargs['pk'])
-        if employee.manager != request.user:
+        employee = get_request_object(request, CustomUser, kwargs['pk'])
+        if employee.manager_id != request.user.pk:
             raise PermissionDenied("شما مدیر این کارمند نیستید.")
         return super().dispatch(request, *args, **kwargs)
 
@@ -76,17 +131,17 @@ class EmployeeOwnerRequiredMixin:
 def employee_owner_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        employee = CustomUser.objects.get(pk=kwargs['pk'])
-        if employee.manager != request.user:
+        employee = get_request_object(request, CustomUser, kwargs['pk'])
+        if employee.manager_id != request.user.pk:
             raise PermissionDenied("شما مدیر این کارمند نیستید.")
         return view_func(request, *args, **kwargs)
     return _wrapped
 
 # --- CBV ---
-class ActivityOwnerRequiredMixin:
+class ActivityOwnerRequiredMixin(RequestObjectMixin):
     def dispatch(self, request, *args, **kwargs):
-        activity = Activity.objects.get(pk=kwargs['pk'])
-        if activity.user != request.user:
+        activity = get_request_object(request, Activity, kwargs['pk'])
+        if activity.user_id != request.user.pk:
             raise PermissionDenied("شما صاحب این فعالیت نیستید.")
         return super().dispatch(request, *args, **kwargs)
 
@@ -94,34 +149,30 @@ class ActivityOwnerRequiredMixin:
 def activity_owner_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        activity = Activity.objects.get(pk=kwargs['pk'])
-        if activity.user != request.user:
+        activity = get_request_object(request, Activity, kwargs['pk'])
+        if activity.user_id != request.user.pk:
             raise PermissionDenied("شما صاحب این فعالیت نیستید.")
         return view_func(request, *args, **kwargs)
     return _wrapped
 
 # --- CBV ---
-class ManagerActivityRequiredMixin:
+class ManagerActivityRequiredMixin(RequestObjectMixin):
     def dispatch(self, request, *args, **kwargs):
-        activity = Activity.objects.get(pk=kwargs['pk'])
-        if activity.user.manager != request.user:
-            raise PermissionDenied("این فعالیت مربوط به کارمند شما نیست.")
+        get_scoped_object(request, Activity.objects.managed_by(request.user), kwargs['pk'], "این فعالیت مربوط به کارمند شما نیست.")
         return super().dispatch(request, *args, **kwargs)
 
 # --- FBV ---
 def manager_activity_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        activity = Activity.objects.get(pk=kwargs['pk'])
-        if activity.user.manager != request.user:
-            raise PermissionDenied("این فعالیت مربوط به کارمند شما نیست.")
+        get_scoped_object(request, Activity.objects.managed_by(request.user), kwargs['pk'], "این فعالیت مربوط به کارمند شما نیست.")
         return view_func(request, *args, **kwargs)
     return _wrapped
 
 # --- CBV ---
-class VisibleActivityRequiredMixin:
+class VisibleActivityRequiredMixin(RequestObjectMixin):
     def dispatch(self, request, *args, **kwargs):
-        activity = Activity.objects.get(pk=kwargs['pk'])
+        activity = get_request_object(request, Activity, kwargs['pk'])
         if activity.visibility == False:
             raise PermissionDenied("این فعالیت مخفی است.")
         return super().dispatch(request, *args, **kwargs)
@@ -130,34 +181,36 @@ class VisibleActivityRequiredMixin:
 def visible_activity_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        activity = Activity.objects.get(pk=kwargs['pk'])
+        activity = get_request_object(request, Activity, kwargs['pk'])
         if activity.visibility == False:
             raise PermissionDenied("این فعالیت مخفی است.")
         return view_func(request, *args, **kwargs)
     return _wrapped
 
 # --- CBV ---
-class ProfileOwnerRequiredMixin:
+class ProfileOwnerRequiredMixin(RequestObjectMixin):
     def dispatch(self, request, *args, **kwargs):
-        profile = Profile.objects.get(pk=kwargs['pk'])
-        if profile.user != request.user:
+        profile = get_request_object(request, Profile, kwargs['pk'])
+        if profile.user_id != request.user.pk:
             raise PermissionDenied("این پروفایل متعلق به شما نیست.")
+        request.user.user_profile = profile
         return super().dispatch(request, *args, **kwargs)
 
 # --- FBV ---
 def profile_owner_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        profile = Profile.objects.get(pk=kwargs['pk'])
-        if profile.user != request.user:
+        profile = get_request_object(request, Profile, kwargs['pk'])
+        if profile.user_id != request.user.pk:
             raise PermissionDenied("این پروفایل متعلق به شما نیست.")
+        request.user.user_profile = profile
         return view_func(request, *args, **kwargs)
     return _wrapped
 
 # --- CBV ---
-class PassedUserApprovedProfileRequiredMixin:
+class PassedUserApprovedProfileRequiredMixin(RequestObjectMixin):
     def dispatch(self, request, *args, **kwargs):
-        user = CustomUser.objects.get(pk=kwargs['pk'])
+        user = get_request_object(request, CustomUser, kwargs['pk'])
         if not hasattr(user, 'user_profile') or user.user_profile.status != '2':
             raise PermissionDenied("این کارمند پروفایل تایید شده ندارد.")
         return super().dispatch(request, *args, **kwargs)
@@ -166,32 +219,17 @@ class PassedUserApprovedProfileRequiredMixin:
 def passed_user_approved_profile_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        user = CustomUser.objects.get(pk=kwargs['pk'])
+        user = get_request_object(request, CustomUser, kwargs['pk'])
         if not hasattr(user, 'user_profile') or user.user_profile.status != '2':
             raise PermissionDenied("این کارمند پروفایل تایید شده ندارد.")
         return view_func(request, *args, **kwargs)
     return _wrapped
 
 # --- CBV ---
-class ActiveTimeRequiredMixin:
+class ActiveTimeRequiredMixin(RequestObjectMixin):
     def dispatch(self, request, *args, **kwargs):
-        activity = Activity.objects.get(pk=kwargs['pk'])
-
-        # تبدیل تاریخ شمسی به میلادی
-        start_date = jalali.Persian(activity.start_date).gregorian_datetime()
-        end_date = jalali.Persian(activity.end_date).gregorian_datetime()
-
-        # ساخت datetime
-        start = datetime.datetime.combine(start_date, activity.start_time)
-        end = datetime.datetime.combine(end_date, activity.end_time)
-
-        # اطمینان از aware بودن
-        if start.tzinfo is None:
-            start = make_aware(start)
-        if end.tzinfo is None:
-            end = make_aware(end)
-
-        if not (start <= now() <= end):
+        activity = get_request_object(request, Activity, kwargs['pk'])
+        if not activity.is_active():
             raise PermissionDenied("این فعالیت در بازه زمانی معتبر نیست.")
         return super().dispatch(request, *args, **kwargs)
 
@@ -199,42 +237,32 @@ class ActiveTimeRequiredMixin:
 def active_time_required(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        activity = Activity.objects.get(pk=kwargs['pk'])
-
-        start_date = jalali.Persian(activity.start_date).gregorian_datetime()
-        end_date = jalali.Persian(activity.end_date).gregorian_datetime()
-
-        start = datetime.datetime.combine(start_date, activity.start_time)
-        end = datetime.datetime.combine(end_date, activity.end_time)
-
-        if start.tzinfo is None:
-            start = make_aware(start)
-        if end.tzinfo is None:
-            end = make_aware(end)
-
-        if not (start <= now() <= end):
+        activity = get_request_object(request, Activity, kwargs['pk'])
+        if not activity.is_active():
             raise PermissionDenied("این فعالیت در بازه زمانی معتبر نیست.")
         return view_func(request, *args, **kwargs)
     return _wrapped
 
 # --- FBV ---
 def user_in_conversation_or_admin(view_func):
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async(request, *args, **kwargs):
+            user = await request.auser()
+            await aget_scoped_object(request, Conversation.objects.accessible_by(user), kwargs['pk'], "دسترسی ندارید.")
+            return await view_func(request, *args, **kwargs)
+        return _wrapped_async
+
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        conversation = Conversation.objects.get(pk=kwargs['pk'])
-
-        if request.user.user_type == '1' or request.user in conversation.users.all():
-            return view_func(request, *args, **kwargs)
-        raise HttpResponseForbidden("دسترسی ندارید.")
+        get_scoped_object(request, Conversation.objects.accessible_by(request.user), kwargs['pk'], "دسترسی ندارید.")
+        return view_func(request, *args, **kwargs)
     return _wrapped
 
 # --- FBV ---
 def user_is_message_owner_or_admin(view_func):
     @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
-        message = Message.objects.get(pk=kwargs['pk'])
-
-        if request.user.user_type == '1' or message.user == request.user:
-            return view_func(request, *args, **kwargs)
-        raise HttpResponseForbidden("دسترسی ندارید.")
+        get_scoped_object(request, Message.objects.editable_by(request.user), kwargs['pk'], "دسترسی ندارید.")
+        return view_func(request, *args, **kwargs)
     return _wrapped
@@ -1,7 +1,15 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+import datetime
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
+from django.utils.timezone import now, localtime, make_aware
+from . import jalali, search
+from .fields import JalaliDateField
+from .storage import message_storage
 
 def validate_national_code(value):
     if len(value) != 10 or not value.isdigit():
@@ -13,6 +21,27 @@ def validate_national_code(value):
     if not ((s < 2 and check == s) or (s >= 2 and check == 11 - s)):
         raise ValidationError('کد ملی نامعتبر است.')
 
+class CustomUserQuerySet(models.QuerySet):
+    def team_of(self, manager):
+        return self.filter(manager=manager, user_type='3', user_profile__status='2')
+
+    def visible_to(self, user):
+        if user.user_type == '1':
+            return self.all()
+        if user.user_type == '2':
+            return self.team_of(user)
+        return self.filter(pk=user.pk)
+
+    def ticket_contacts_of(self, user):
+        if user.user_type == '1':
+            return self.exclude(pk=user.pk)
+        if user.user_type == '2':
+            return self.filter(models.Q(manager=user, user_type='3', user_profile__status='2') | models.Q(user_type='1'))
+        return self.filter(models.Q(user_type='1') | models.Q(pk=user.manager_id))
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
 class CustomUser(AbstractUser):
     USER_TYPE_CHOICES = (
         ('1', 'مدیر کل'),
@@ -32,9 +61,14 @@ class CustomUser(AbstractUser):
         verbose_name='مدیر'
     )
 
+    objects = CustomUserManager()
+
     class Meta:
         verbose_name = 'کاربر'
         verbose_name_plural = 'کاربران'
+        indexes = [
+            models.Index(fields=['manager', 'user_type'], name='user_manager_type_idx'),
+        ]
     
     def __str__(self):
         return f'{self.get_user_type_display()}: {self.get_full_name()}'
@@ -68,9 +102,13 @@ class Profile(models.Model):
         validators=[RegexValidator(r'^\d{11}$', message='شماره تلفن همراه باید 11 رقمی و با 0 اول باشد.')]
     )
     national_code = models.CharField(verbose_name='کد ملی', max_length=10, unique=True, validators=[validate_national_code])
-    birthdate = models.CharField(verbose_name='تاریخ تولد', max_length=10)
+    birthdate = JalaliDateField(verbose_name='تاریخ تولد', null=True)
     national_card = models.ImageField(verbose_name='تصویر کارت ملی', upload_to='national_card/')
     guarantee = models.ImageField(verbose_name='تصویر ضمانت نامه', upload_to='guarantee/', null=True, blank=True)
+    national_card_thumbnail = models.ImageField(verbose_name='تصویر کوچک کارت ملی', upload_to='derivatives/national_card/', null=True, blank=True, editable=False)
+    national_card_web = models.ImageField(verbose_name='تصویر وب کارت ملی', upload_to='derivatives/national_card/', null=True, blank=True, editable=False)
+    guarantee_thumbnail = models.ImageField(verbose_name='تصویر کوچک ضمانت نامه', upload_to='derivatives/guarantee/', null=True, blank=True, editable=False)
+    guarantee_web = models.ImageField(verbose_name='تصویر وب ضمانت نامه', upload_to='derivatives/guarantee/', null=True, blank=True, editable=False)
     status = models.CharField(verbose_name='وضعیت', max_length=20, choices=STATUS_CHOICES, default='1')
 
     class Meta:
@@ -80,24 +118,280 @@ class Profile(models.Model):
     def __str__(self):
         return f'پروفایل {self.user} با وضعیت {self.get_status_display()}'
 
+class ConversationQuerySet(models.QuerySet):
+    def accessible_by(self, user):
+        if user.user_type == '1':
+            return self.all()
+        return self.filter(users=user)
+
+    def with_unread_count(self, user):
+        unread_count = ReadState.objects.filter(
+            user=user,
+            conversation=models.OuterRef('pk'),
+        ).values('unread_count')[:1]
+        return self.annotate(unread_count=Coalesce(models.Subquery(unread_count), 0))
+
+    def with_unseen_count(self, user):
+        # برای مدیر کل که معمولا عضو تیکت نیست: پیام های دیگران که هنوز هیچ عضو دیگری آنها را ندیده
+        unseen = Message.objects.filter(conversation=models.OuterRef('pk')).exclude(user=user).with_seen().filter(seen=False)
+        unseen_count = unseen.order_by().values('conversation').annotate(count=models.Count('pk')).values('count')
+        return self.annotate(unseen_count=Coalesce(models.Subquery(unseen_count), 0))
+
+    def bump_version(self, pk):
+        return self.filter(pk=pk).update(version=models.F('version') + 1)
+
+    def get_or_create_direct(self, user, other):
+        with transaction.atomic():
+            conversation, created = self.get_or_create(
+                participants_key=Conversation.direct_key(user.pk, other.pk)
+            )
+            if created:
+                conversation.users.add(user, other)
+        return conversation
+
 class Conversation(models.Model):
     users = models.ManyToManyField(CustomUser, related_name='users_conversations', verbose_name='کاربران تیکت')
+    version = models.PositiveIntegerField(verbose_name='نسخه', default=0, editable=False)
+    participants_key = models.CharField(verbose_name='کلید کاربران', max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    objects = ConversationQuerySet.as_manager()
+
+    @staticmethod
+    def direct_key(*user_ids):
+        return ':'.join(str(pk) for pk in sorted(user_ids))
 
     class Meta:
         verbose_name = 'تیکت'
         verbose_name_plural = 'تیکت ها'
 
+class MessageQuerySet(models.QuerySet):
+    def editable_by(self, user):
+        if user.user_type == '1':
+            return self.all()
+        return self.filter(user=user)
+
+    def with_seen(self):
+        # پیام دیده شده است اگر یکی از کاربران دیگر تیکت تا این پیام را خوانده باشد
+        read_states = ReadState.objects.filter(
+            conversation=models.OuterRef('conversation'),
+            last_read_message_id__gte=models.OuterRef('pk'),
+        ).exclude(user=models.OuterRef('user'))
+        return self.annotate(seen=models.Exists(read_states))
+
+    def unread_by(self, user):
+        last_read = ReadState.objects.filter(
+            user=user,
+            conversation=models.OuterRef('conversation'),
+        ).values('last_read_message_id')[:1]
+        return self.exclude(user=user).filter(
+            id__gt=Coalesce(models.Subquery(last_read), 0)
+        )
+
 class Message(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='user_messages', verbose_name='کاربر', editable=True)
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='conversation_messages', verbose_name='تیکت', editable=True)
     body = models.TextField(verbose_name='پیام')
-    file = models.FileField(verbose_name='فایل ضمیمه', upload_to='message/', null=True, blank=True)
+    file = models.FileField(verbose_name='فایل ضمیمه', upload_to='message/', storage=message_storage, null=True, blank=True)
     created_at = models.DateTimeField(verbose_name='تاریخ', auto_now_add=True)
-    seen = models.BooleanField(verbose_name='دیده شده', default=False)
+    updated_at = models.DateTimeField(verbose_name='تاریخ ویرایش', auto_now=True)
+
+    objects = MessageQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'پیام'
         verbose_name_plural = 'پیام ها'
+        indexes = [
+            models.Index(fields=['conversation', 'id'], name='message_conversation_id_idx'),
+        ]
+
+class FileBlobManager(models.Manager):
+    def acquire(self, name):
+        # اگر delete_unused هم زمان ردیف را حذف کرده باشد update صفر ردیف را تغییر می دهد و ردیف دوباره ساخته می شود
+        while True:
+            self.bulk_create([self.model(name=name)], ignore_conflicts=True)
+            if self.filter(name=name).update(ref_count=models.F('ref_count') + 1):
+                return
+
+    def release(self, name):
+        """Drops one reference and returns True when the blob is no longer used."""
+        self.filter(name=name, ref_count__gt=0).update(ref_count=models.F('ref_count') - 1)
+        return self.filter(name=name, ref_count=0).exists()
+
+    def delete_unused(self, name, storage):
+        # ردیف قفل می شود تا acquire هم زمان تا پایان این تراکنش صبر کند؛ فایل فقط وقتی حذف می شود که هنوز ارجاعی نداشته باشد
+        with transaction.atomic():
+            blob = self.select_for_update().filter(name=name).first()
+            if blob is not None and blob.ref_count == 0:
+                blob.delete()
+                storage.delete(name)
+
+class FileBlob(models.Model):
+    name = models.CharField(verbose_name='نام فایل', max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(verbose_name='تعداد ارجاع', default=0)
+
+    objects = FileBlobManager()
+
+    class Meta:
+        verbose_name = 'فایل ذخیره شده'
+        verbose_name_plural = 'فایل های ذخیره شده'
+
+class ReadStateManager(models.Manager):
+    # جمع پیام های خوانده نشده هر کاربر در کش نگه داشته می شود و با هر تغییر شمارنده پاک می شود
+    @staticmethod
+    def unread_key(user_id):
+        return f'unread:total:{user_id}'
+
+    def forget(self, user_ids):
+        keys = [self.unread_key(pk) for pk in user_ids]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
+
+    def mark_read(self, user, conversation, message_id):
+        # آخرین پیام خوانده شده فقط جلو می رود و شمارنده در همان UPDATE از روی پیام های بعد از آن دوباره شمرده می شود؛
+        # پیامی که بین خواندن پیام ها و این به روزرسانی ثبت شده خوانده نشده باقی می ماند
+        self.bulk_create([self.model(user=user, conversation=conversation)], ignore_conflicts=True)
+        last_read = Greatest(models.F('last_read_message_id'), models.Value(message_id))
+        unread = Message.objects.filter(
+            conversation=models.OuterRef('conversation'),
+            id__gt=Greatest(models.OuterRef('last_read_message_id'), models.Value(message_id)),
+        ).exclude(user=models.OuterRef('user')).order_by().values('conversation').annotate(count=models.Count('pk')).values('count')
+        self.filter(user=user, conversation=conversation).update(
+            last_read_message_id=last_read,
+            unread_count=Coalesce(models.Subquery(unread), 0),
+        )
+        self.forget([user.pk])
+
+    def message_created(self, message):
+        recipients = message.conversation.users.exclude(pk=message.user_id).values_list('pk', flat=True)
+        self.bulk_create(
+            [self.model(user_id=pk, conversation_id=message.conversation_id) for pk in recipients],
+            ignore_conflicts=True,
+        )
+        self.filter(
+            conversation_id=message.conversation_id,
+            user__in=models.Subquery(recipients),
+        ).update(unread_count=models.F('unread_count') + 1)
+        self.forget(recipients)
+
+    def message_deleted(self, message):
+        affected = self.filter(
+            conversation_id=message.conversation_id,
+            last_read_message_id__lt=message.id,
+            unread_count__gt=0,
+        ).exclude(user_id=message.user_id)
+        self.forget(list(affected.values_list('user_id', flat=True)))
+        affected.update(unread_count=models.F('unread_count') - 1)
+
+    def unread_total(self, user):
+        key = self.unread_key(user.pk)
+        total = cache.get(key)
+        if total is None:
+            total = self.filter(user=user, unread_count__gt=0).aggregate(total=Coalesce(models.Sum('unread_count'), 0))['total']
+            cache.set(key, total, settings.UNREAD_BADGE_TTL)
+        return total
+
+    def rebuild(self):
+        read_states = []
+        for conversation in Conversation.objects.prefetch_related('users'):
+            for user in conversation.users.all():
+                unread_count = conversation.conversation_messages.unread_by(user).count()
+                read_states.append(self.model(user=user, conversation=conversation, unread_count=unread_count))
+
+        self.bulk_create(
+            read_states,
+            update_conflicts=True,
+            unique_fields=['user', 'conversation'],
+            update_fields=['unread_count'],
+            batch_size=500,
+        )
+        self.forget({read_state.user_id for read_state in read_states})
+        return len(read_states)
+
+class ReadState(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='user_read_states', verbose_name='کاربر')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='conversation_read_states', verbose_name='تیکت')
+    last_read_message_id = models.BigIntegerField(verbose_name='آخرین پیام خوانده شده', default=0)
+    unread_count = models.PositiveIntegerField(verbose_name='تعداد پیام های خوانده نشده', default=0)
+
+    objects = ReadStateManager()
+
+    class Meta:
+        verbose_name = 'وضعیت خواندن'
+        verbose_name_plural = 'وضعیت های خواندن'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'conversation'], name='unique_read_state'),
+        ]
+        indexes = [
+            # وضعیت دیده شدن پیام ها (with_seen)
+            models.Index(fields=['conversation', 'last_read_message_id'], name='read_state_position_idx'),
+            # نشان پیام های خوانده نشده فقط ردیف های غیر صفر را جمع می زند
+            models.Index(fields=['user'], condition=models.Q(unread_count__gt=0), name='read_state_unread_idx'),
+        ]
+
+class ActivityQuerySet(models.QuerySet):
+    WINDOW_FILTERS = ('active', 'overdue', 'week')
+
+    def of_team(self, manager):
+        # فهرست فعالیت های تیم فقط کارمندان با پروفایل تایید شده را نشان می دهد (مثل team_of)
+        return self.filter(user__manager=manager, user__user_type='3', user__user_profile__status='2')
+
+    def managed_by(self, manager):
+        # دسترسی مدیر به یک فعالیت محدود به وضعیت پروفایل کارمند نیست
+        return self.filter(user__manager=manager)
+
+    def visible_to(self, user):
+        # مدیر کل همه را می بیند، مدیر فعالیت های قابل نمایش خودش و همه فعالیت های تیمش را و کارمند فقط فعالیت های قابل نمایش خودش را
+        if user.user_type == '1':
+            return self.all()
+        own = models.Q(user=user, visibility=True)
+        if user.user_type == '2':
+            return self.filter(own | models.Q(user__manager=user))
+        return self.filter(own)
+
+    def active(self, at=None):
+        at = at or now()
+        return self.filter(starts_at__lte=at, ends_at__gte=at)
+
+    def overdue(self, at=None):
+        return self.filter(ends_at__lt=at or now(), is_completed=False)
+
+    def due_this_week(self, at=None):
+        # هفته با جمعه تمام می شود
+        at = localtime(at or now())
+        days_left = (4 - at.weekday()) % 7
+        week_end = datetime.datetime.combine(at.date() + datetime.timedelta(days=days_left + 1), datetime.time.min)
+        return self.filter(ends_at__gte=at, ends_at__lt=make_aware(week_end), is_completed=False)
+
+    def in_window(self, window):
+        if window == 'active':
+            return self.active()
+        if window == 'overdue':
+            return self.overdue()
+        if window == 'week':
+            return self.due_this_week()
+        return self
+
+class ActivityManager(models.Manager.from_queryset(ActivityQuerySet)):
+    def bulk_assign(self, user_ids, progress=None, **activity_data):
+        from .stats import invalidate
+
+        user_ids = list(user_ids)
+        total = len(user_ids)
+        batch_size = settings.BULK_ACTIVITY_BATCH_SIZE
+
+        prototype = self.model(**activity_data)
+        prototype.compute_window()
+        activity_data = {**activity_data, 'starts_at': prototype.starts_at, 'ends_at': prototype.ends_at}
+
+        with transaction.atomic():
+            for start in range(0, total, batch_size):
+                batch = user_ids[start:start + batch_size]
+                search.index_activities(self.bulk_create([self.model(user_id=pk, **activity_data) for pk in batch]))
+                if progress:
+                    progress(start + len(batch), total)
+            # bulk_create سیگنال ندارد؛ ایندکس جستجو بالاتر به روز شد
+            transaction.on_commit(invalidate)
+        return total
 
 class Activity(models.Model):
     SENSITIVITY_CHOICES = (
@@ -110,17 +404,45 @@ class Activity(models.Model):
     creater = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='creater_activities', verbose_name='خالق', editable=False)
     title = models.CharField(verbose_name='عنوان', max_length=1000)
     body = models.TextField(verbose_name='توضیحات')
-    start_date = models.CharField(verbose_name='تاریخ شروع', max_length=10)
+    start_date = JalaliDateField(verbose_name='تاریخ شروع', db_index=True, null=True)
     start_time = models.TimeField(verbose_name='ساعت شروع')
-    end_date = models.CharField(verbose_name='تاریخ پایان', max_length=10)
+    end_date = JalaliDateField(verbose_name='تاریخ پایان', db_index=True, null=True)
     end_time = models.TimeField(verbose_name='ساعت پایان')
     sensitivity = models.CharField(verbose_name='حساسیت', max_length=5, choices=SENSITIVITY_CHOICES)
     is_completed = models.BooleanField(verbose_name='وضعیت انجام', default=False)
     visibility = models.BooleanField(verbose_name='وضعیت نمایش')
+    starts_at = models.DateTimeField(verbose_name='زمان شروع', null=True, blank=True, editable=False, db_index=True)
+    ends_at = models.DateTimeField(verbose_name='زمان پایان', null=True, blank=True, editable=False, db_index=True)
+
+    objects = ActivityManager()
 
     class Meta:
         verbose_name = 'فعالیت'
         verbose_name_plural = 'فعالیت ها'
+        indexes = [
+            models.Index(fields=['user', 'visibility', '-id'], name='activity_user_visible_idx'),
+            models.Index(fields=['creater'], condition=models.Q(visibility=False), name='activity_hidden_creater_idx'),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    @staticmethod
+    def jalali_datetime(date, time):
+        try:
+            day = jalali.JalaliDate.parse(date).to_gregorian()
+        except (TypeError, ValueError):
+            return None
+        return make_aware(datetime.datetime.combine(day, time))
+
+    def compute_window(self):
+        self.starts_at = self.jalali_datetime(self.start_date, self.start_time)
+        self.ends_at = self.jalali_datetime(self.end_date, self.end_time)
+
+    def is_active(self, at=None):
+        at = at or now()
+        return self.starts_at is not None and self.ends_at is not None and self.starts_at <= at <= self.ends_at
+
+    def save(self, *args, **kwargs):
+        self.compute_window()
+        super().save(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,31 @@
+import re
+
+# یکسان سازی نویسه های عربی/فارسی و ارقام برای ایندکس و جستجو
+
+CHARACTER_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    '\u200c': ' ',  # ZWNJ
+    '\u200d': '',   # ZWJ
+    '\u0640': '',   # کشیده
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # ارقام عربی
+})
+
+DIACRITICS = re.compile('[\u064B-\u065F\u0670]')
+WHITESPACE = re.compile(r'\s+')
+TOKEN = re.compile(r'\w+')
+
+def normalize(text):
+    if not text:
+        return ''
+    text = DIACRITICS.sub('', text.translate(CHARACTER_MAP))
+    return WHITESPACE.sub(' ', text).strip().lower()
+
+def tokenize(text):
+    return TOKEN.findall(normalize(text))
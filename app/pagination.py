@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.http import Http404
+
+# صفحه بندی بر اساس کلید (id) به جای OFFSET؛ هزینه صفحه های عمیق برابر صفحه اول است
+# و COUNT کامل اجرا نمی شود. فقط برای ترتیب نزولی id.
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, urls, count=None, count_is_capped=False):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.first_page_url, self.previous_page_url, self.next_page_url = urls
+        self.count = count
+        self.count_is_capped = count_is_capped
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+def estimated_count(queryset, limit):
+    """Returns ``(count, capped)``; at most ``limit + 1`` rows are counted, so the cost does not grow with the table."""
+    count = queryset.order_by()[:limit + 1].count()
+    return min(count, limit), count > limit
+
+class KeysetPaginationMixin:
+    """ListView pagination with ``?after=<id>`` / ``?before=<id>`` cursors on ``-id``."""
+
+    show_count = False
+
+    def cursor(self, name):
+        value = self.request.GET.get(name)
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise Http404('صفحه نامعتبر است.')
+
+    def page_url(self, **cursor):
+        query = self.request.GET.copy()
+        for name in ('page', 'after', 'before'):
+            query.pop(name, None)
+        for name, value in cursor.items():
+            query[name] = str(value)
+        return '?' + query.urlencode()
+
+    def paginate_queryset(self, queryset, page_size):
+        after, before = self.cursor('after'), self.cursor('before')
+        count, capped = estimated_count(queryset, settings.PAGINATION_COUNT_LIMIT) if self.show_count else (None, False)
+
+        if before is not None:
+            rows = list(queryset.filter(pk__gt=before).order_by('pk')[:page_size + 1])
+            has_previous, has_next = len(rows) > page_size, True
+            rows = rows[:page_size][::-1]
+        else:
+            if after is not None:
+                queryset = queryset.filter(pk__lt=after)
+            rows = list(queryset.order_by('-pk')[:page_size + 1])
+            has_previous, has_next = after is not None, len(rows) > page_size
+            rows = rows[:page_size]
+
+        urls = (
+            self.page_url(),
+            self.page_url(before=rows[0].pk) if rows and has_previous else self.page_url(),
+            self.page_url(after=rows[-1].pk) if rows and has_next else None,
+        )
+        page = KeysetPage(rows, has_next, has_previous, urls, count, capped)
+        return None, page, rows, page.has_other_pages()
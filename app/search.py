@@ -0,0 +1,139 @@
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .normalizer import normalize, tokenize
+
+# ایندکس جستجوی متنی: FTS5 روی SQLite و tsvector روی PostgreSQL.
+# روی سایر دیتابیس ها جستجو به icontains برمی گردد.
+# هر ایندکس می تواند چند ستون داشته باشد؛ در PostgreSQL ستون ها با وزن A، B، ... از هم جدا می شوند.
+
+MESSAGE_INDEX = 'app_message_fts'
+USER_INDEX = 'app_customuser_fts'
+ACTIVITY_INDEX = 'app_activity_fts'
+
+INDEX_COLUMNS = {
+    MESSAGE_INDEX: ('document',),
+    USER_INDEX: ('full_name', 'username'),
+    ACTIVITY_INDEX: ('title',),
+}
+WEIGHTS = 'ABCD'
+
+def is_supported(vendor=None):
+    return (vendor or connection.vendor) in ('sqlite', 'postgresql')
+
+def create_index(schema_editor, table):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        columns = ', '.join(INDEX_COLUMNS[table])
+        schema_editor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns}, tokenize='unicode61')")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'CREATE TABLE IF NOT EXISTS {table} (id bigint PRIMARY KEY, document tsvector NOT NULL)')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_document ON {table} USING GIN (document)')
+
+def drop_index(schema_editor, table):
+    if is_supported(schema_editor.connection.vendor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+def index_documents(table, rows):
+    """Indexes ``(pk, text, ...)`` rows, one text per column of the index."""
+    if not is_supported():
+        return
+    rows = [(pk, *(normalize(text) for text in texts)) for pk, *texts in rows]
+    if not rows:
+        return
+    columns = INDEX_COLUMNS[table]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [row[:1] for row in rows])
+            cursor.executemany(f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES (%s, {placeholders})', rows)
+        else:
+            document = ' || '.join(f"setweight(to_tsvector('simple', %s), '{weight}')" for weight in WEIGHTS[:len(columns)])
+            cursor.executemany(
+                f"INSERT INTO {table} (id, document) VALUES (%s, {document}) "
+                f"ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+def index_document(table, pk, *texts):
+    index_documents(table, [(pk, *texts)])
+
+def remove_document(table, pk):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+        else:
+            cursor.execute(f'DELETE FROM {table} WHERE id = %s', [pk])
+
+def match(table, query, column=None):
+    """Subquery of matching ids for ``id__in``, or None when the query has no searchable token."""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    if connection.vendor == 'sqlite':
+        prefix = f'{column} : ' if column else ''
+        expression = ' '.join(f'{prefix}"{token}"*' for token in tokens)
+        return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression])
+    weight = WEIGHTS[INDEX_COLUMNS[table].index(column)] if column else ''
+    expression = ' & '.join(f'{token}:*{weight}' for token in tokens)
+    return RawSQL(f"SELECT id FROM {table} WHERE document @@ to_tsquery('simple', %s)", [expression])
+
+def filter_matching(queryset, table, query, fallback, column=None):
+    if not is_supported():
+        return queryset.filter(fallback)
+    ids = match(table, query, column)
+    if ids is None:
+        return queryset.none()
+    return queryset.filter(id__in=ids)
+
+# --- messages ---
+
+def index_message(message):
+    index_document(MESSAGE_INDEX, message.pk, message.body)
+
+def remove_message(message):
+    remove_document(MESSAGE_INDEX, message.pk)
+
+def search_messages(user, query):
+    from .models import Message
+
+    messages = Message.objects.filter(conversation__users=user)
+    if is_supported():
+        ids = match(MESSAGE_INDEX, query)
+        if ids is None:
+            return messages.none()
+        messages = messages.filter(id__in=ids)
+    else:
+        messages = messages.filter(body__icontains=query)
+    return messages.select_related('user').order_by('-id')
+
+# --- users ---
+
+def user_row(user):
+    return user.pk, f'{user.first_name} {user.last_name}', user.username
+
+def index_user(user):
+    index_documents(USER_INDEX, [user_row(user)])
+
+def remove_user(user):
+    remove_document(USER_INDEX, user.pk)
+
+def search_users_by_name(queryset, query):
+    fallback = Q(first_name__icontains=query) | Q(last_name__icontains=query)
+    return filter_matching(queryset, USER_INDEX, query, fallback, 'full_name')
+
+def search_users_by_username(queryset, query):
+    return filter_matching(queryset, USER_INDEX, query, Q(username__icontains=query), 'username')
+
+# --- activities ---
+
+def index_activities(activities):
+    index_documents(ACTIVITY_INDEX, [(activity.pk, activity.title) for activity in activities])
+
+def remove_activity(activity):
+    remove_document(ACTIVITY_INDEX, activity.pk)
+
+def search_activities(queryset, query):
+    return filter_matching(queryset, ACTIVITY_INDEX, query, Q(title__icontains=query))
@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from . import models, search, stats, tasks, images
+
+@receiver(post_save, sender=models.Message)
+def index_message(sender, instance, **kwargs):
+    search.index_message(instance)
+
+# شمارنده های خوانده نشده با سیگنال به روز می شوند تا حذف های آبشاری (کاربر، تیکت) و ساخت پیام خارج از view ها هم دیده شوند
+@receiver(post_save, sender=models.Message)
+def count_unread_message(sender, instance, created, **kwargs):
+    if created:
+        models.ReadState.objects.message_created(instance)
+
+@receiver(post_delete, sender=models.Message)
+def uncount_unread_message(sender, instance, **kwargs):
+    models.ReadState.objects.message_deleted(instance)
+
+@receiver(post_delete, sender=models.ReadState)
+def forget_unread_total(sender, instance, **kwargs):
+    models.ReadState.objects.forget([instance.user_id])
+
+# ارجاع فایل در ContentAddressedStorage._save گرفته می شود، پیش از آنکه نام فایل موجود برگردانده شود
+@receiver(post_delete, sender=models.Message)
+def release_message_file(sender, instance, **kwargs):
+    if instance.file and models.FileBlob.objects.release(instance.file.name):
+        storage, name = instance.file.storage, instance.file.name
+        transaction.on_commit(lambda: models.FileBlob.objects.delete_unused(name, storage))
+
+@receiver(post_delete, sender=models.Message)
+def unindex_message(sender, instance, **kwargs):
+    search.remove_message(instance)
+
+USER_SEARCH_FIELDS = {'first_name', 'last_name', 'username'}
+
+@receiver(post_save, sender=models.CustomUser)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    # ورود کاربر فقط last_login را ذخیره می کند
+    if update_fields is None or USER_SEARCH_FIELDS & set(update_fields):
+        search.index_user(instance)
+
+@receiver(post_delete, sender=models.CustomUser)
+def unindex_user(sender, instance, **kwargs):
+    search.remove_user(instance)
+
+@receiver(post_save, sender=models.Activity)
+def index_activity(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'title' in update_fields:
+        search.index_activities([instance])
+
+@receiver(post_delete, sender=models.Activity)
+def unindex_activity(sender, instance, **kwargs):
+    search.remove_activity(instance)
+
+@receiver(post_init, sender=models.Profile)
+def remember_profile_images(sender, instance, **kwargs):
+    # خواندن فیلد deferred در post_init خود نمونه را دوباره می سازد و به بازگشت بی پایان می رسد
+    deferred = instance.get_deferred_fields()
+    instance._original_images = {
+        field: getattr(instance, field).name for field in images.IMAGE_FIELDS if field not in deferred
+    }
+
+def changed_profile_images(instance):
+    original = instance.__dict__.setdefault('_original_images', {})
+    loaded = [field for field in images.IMAGE_FIELDS if field not in instance.get_deferred_fields()]
+    unknown = [field for field in loaded if field not in original]
+    if unknown and instance.pk:
+        # فیلدی که deferred بوده و بعدا خوانده یا مقداردهی شده، مقدار قبلی اش از دیتابیس گرفته می شود
+        original.update(models.Profile.objects.filter(pk=instance.pk).values(*unknown).first() or {})
+    return [field for field in loaded if getattr(instance, field).name != original.get(field)]
+
+def delete_stale_derivatives(instance):
+    files = instance.__dict__.pop('_stale_derivatives', None)
+    if files:
+        transaction.on_commit(lambda: images.delete_files(files))
+
+@receiver(pre_save, sender=models.Profile)
+def reset_profile_derivatives(sender, instance, **kwargs):
+    changed = changed_profile_images(instance)
+    if changed and instance.pk:
+        # نام ها از دیتابیس خوانده می شوند چون کار پس زمینه ممکن است بعد از بارگذاری این نمونه آنها را ساخته باشد
+        instance._stale_derivatives = images.derivative_files(instance.pk, changed)
+    for field in changed:
+        for derivative in images.DERIVATIVE_SIZES:
+            setattr(instance, images.derivative_field(field, derivative), None)
+
+@receiver(post_save, sender=models.Profile)
+def queue_profile_derivatives(sender, instance, **kwargs):
+    delete_stale_derivatives(instance)
+    for field in changed_profile_images(instance):
+        if getattr(instance, field):
+            tasks.enqueue(images.build_profile_derivatives, instance.pk, field)
+    remember_profile_images(sender, instance)
+
+@receiver(pre_delete, sender=models.Profile)
+def collect_profile_derivatives(sender, instance, **kwargs):
+    instance._stale_derivatives = images.derivative_files(instance.pk, images.IMAGE_FIELDS)
+
+@receiver(post_delete, sender=models.Profile)
+def delete_profile_derivatives(sender, instance, **kwargs):
+    delete_stale_derivatives(instance)
+
+# فیلدهایی که شمارنده های داشبورد به آنها وابسته اند
+STATS_FIELDS = {
+    models.CustomUser: {'user_type', 'manager'},
+    models.Profile: {'user', 'status'},
+    models.Activity: {'user', 'creater', 'visibility'},
+}
+
+@receiver([post_save, post_delete], sender=models.CustomUser)
+@receiver([post_save, post_delete], sender=models.Profile)
+@receiver([post_save, post_delete], sender=models.Activity)
+def invalidate_dashboard_stats(sender, update_fields=None, **kwargs):
+    # مثلا ورود کاربر فقط last_login را ذخیره می کند
+    if update_fields is None or STATS_FIELDS[sender] & {sender._meta.get_field(name).name for name in update_fields}:
+        transaction.on_commit(stats.invalidate)
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from . import models
+
+# شمارنده های داشبورد با یک کوئری تجمیعی برای هر مدل محاسبه و برای مدت کوتاهی کش می شوند.
+# هر تغییر در کاربر، پروفایل یا فعالیت نسل کش را یکی بالا می برد و همه شمارنده ها باطل می شوند.
+
+GENERATION_KEY = 'dashboard:stats:generation'
+
+def _generation():
+    return cache.get_or_set(GENERATION_KEY, 1, None)
+
+def invalidate():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+def _cached(name, compute):
+    key = f'dashboard:stats:{_generation()}:{name}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        cache.set(key, stats, settings.DASHBOARD_STATS_TTL)
+    return stats
+
+def super_admin_stats():
+    def compute():
+        return {
+            **models.CustomUser.objects.aggregate(
+                users_count=Count('pk'),
+                managers_count=Count('pk', filter=Q(user_type='2')),
+                employees_count=Count('pk', filter=Q(user_type='3')),
+            ),
+            **models.Activity.objects.aggregate(
+                activities_count=Count('pk', filter=Q(visibility=True)),
+                hidden_activities_count=Count('pk', filter=Q(visibility=False)),
+            ),
+            **models.Profile.objects.aggregate(
+                profiles_awaiting_count=Count('pk', filter=Q(status='1')),
+            ),
+        }
+    return _cached('super_admin', compute)
+
+def manager_stats(manager):
+    def compute():
+        return {
+            **models.CustomUser.objects.aggregate(
+                employees_count=Count('pk', filter=Q(manager=manager, user_type='3', user_profile__status='2')),
+            ),
+            **models.Activity.objects.filter(Q(creater=manager) | Q(user=manager)).aggregate(
+                hidden_activities_count=Count('pk', filter=Q(creater=manager, visibility=False)),
+                my_activities_count=Count('pk', filter=Q(user=manager, visibility=True)),
+            ),
+        }
+    return _cached(f'manager:{manager.pk}', compute)
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once, under ``<upload_to>/ab/cd/<sha256><ext>``.
+
+    The digest is computed while the upload is streamed to a temporary file, so
+    identical uploads end up on the same name and are never suffixed. Every save
+    takes a ``FileBlob`` reference on the name.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def blob_name(self, name, digest):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+
+    def _save(self, name, content):
+        os.makedirs(self.location, exist_ok=True)
+        sha256 = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.location, prefix='.upload-', delete=False) as temporary:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                sha256.update(chunk)
+                temporary.write(chunk)
+
+        name = self.blob_name(name, sha256.hexdigest())
+        # ارجاع پیش از بررسی وجود فایل گرفته می شود؛ delete_unused هم زمان یا منتظر می ماند یا فایل را حذف شده می گذارد و دوباره نوشته می شود
+        from .models import FileBlob
+        FileBlob.objects.acquire(name)
+        if self.exists(name):
+            os.remove(temporary.name)
+            return name
+
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        file_move_safe(temporary.name, full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+message_storage = ContentAddressedStorage()
@@ -0,0 +1,81 @@
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# صف ساده کارهای پس زمینه درون پردازه؛ کارها بعد از commit تراکنش جاری روی thread جداگانه اجرا می شوند.
+
+_executor = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_TASK_WORKERS,
+            thread_name_prefix='app-task',
+        )
+    return _executor
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+    finally:
+        close_old_connections()
+
+def enqueue(func, *args, **kwargs):
+    def submit():
+        if settings.BACKGROUND_TASKS_EAGER:
+            func(*args, **kwargs)
+        else:
+            _get_executor().submit(_run, func, args, kwargs)
+    transaction.on_commit(submit)
+
+# --- jobs with progress ---
+
+# وضعیت کارها در کش پیش فرض نگه داشته می شود؛ کش درون پردازه ای در پردازه های دیگر دیده نمی شود،
+# پس کار فقط وقتی به پس زمینه فرستاده می شود که کش بین پردازه ها مشترک باشد (مثلا Redis یا Memcached)
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+def jobs_supported():
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+def _job_key(job_id):
+    return f'tasks:job:{job_id}'
+
+def update_job(job_id, **fields):
+    job = cache.get(_job_key(job_id)) or {}
+    job.update(fields)
+    cache.set(_job_key(job_id), job, settings.BACKGROUND_JOB_TTL)
+    return job
+
+def get_job(job_id):
+    return cache.get(_job_key(job_id))
+
+def enqueue_job(func, *args, owner=None, **kwargs):
+    job_id = uuid.uuid4().hex
+    update_job(job_id, status='pending', done=0, total=None, owner=owner)
+
+    def progress(done, total):
+        update_job(job_id, done=done, total=total)
+
+    def run_job():
+        update_job(job_id, status='running')
+        try:
+            func(*args, progress=progress, **kwargs)
+        except Exception:
+            update_job(job_id, status='failed')
+            raise
+        update_job(job_id, status='done')
+
+    enqueue(run_job)
+    return job_id
@@ -1,3 +1,1294 @@
-from django.test import TestCase
+import copy
+import datetime
+import gzip
+import importlib
+import os
+import pickle
+import re
+import tempfile
+import threading
+import unittest
+from io import BytesIO
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import connection, connections, OperationalError
+from django.db.migrations.executor import MigrationExecutor
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import make_aware
+from django.views.generic import ListView
+from PIL import Image
+from . import events, fields, images, jalali, middleware, models, normalizer, pagination, search, stats, tasks, views
 
-# Create your tests here.
+ONE_DAY = datetime.timedelta(days=1)
+
+# --- jalali ---
+
+def legacy_to_persian(year, month, day):
+    # نسخه قبلی jalali.Gregorian برای مقایسه
+    d_4 = year % 4
+    g_a = [0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+    doy_g = g_a[month] + day
+    if d_4 == 0 and month > 2:
+        doy_g += 1
+    d_33 = int(((year - 16) % 132) * .0305)
+    a = 286 if (d_33 == 3 or d_33 < (d_4 - 1) or d_4 == 0) else 287
+    if (d_33 == 1 or d_33 == 2) and (d_33 == d_4 or d_4 == 1):
+        b = 78
+    else:
+        b = 80 if (d_33 == 3 and d_4 == 0) else 79
+    if int((year - 10) / 63) == 30:
+        a -= 1
+        b += 1
+    if doy_g > b:
+        jy = year - 621
+        doy_j = doy_g - b
+    else:
+        jy = year - 622
+        doy_j = doy_g + a
+    if doy_j < 187:
+        jm = int((doy_j - 1) / 31)
+        jd = doy_j - (31 * jm)
+        jm += 1
+    else:
+        jm = int((doy_j - 187) / 30)
+        jd = doy_j - 186 - (jm * 30)
+        jm += 7
+    return jy, jm, jd
+
+def legacy_to_gregorian(year, month, day):
+    # نسخه قبلی jalali.Persian برای مقایسه
+    d_4 = (year + 1) % 4
+    if month < 7:
+        doy_j = ((month - 1) * 31) + day
+    else:
+        doy_j = ((month - 7) * 30) + day + 186
+    d_33 = int(((year - 55) % 132) * .0305)
+    a = 287 if (d_33 != 3 and d_4 <= d_33) else 286
+    if (d_33 == 1 or d_33 == 2) and (d_33 == d_4 or d_4 == 1):
+        b = 78
+    else:
+        b = 80 if (d_33 == 3 and d_4 == 0) else 79
+    if int((year - 19) / 63) == 20:
+        a -= 1
+        b += 1
+    if doy_j <= a:
+        gy = year + 621
+        gd = doy_j + b
+    else:
+        gy = year + 622
+        gd = doy_j - a
+    for gm, v in enumerate([0, 31, 29 if (gy % 4 == 0) else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]):
+        if gd <= v:
+            break
+        gd -= v
+    return gy, gm, gd
+
+def is_next_day(previous, current):
+    year, month, day = previous
+    if current == (year, month, day + 1):
+        return True
+    return day >= 29 and current in ((year, month + 1, 1), (year + 1, 1, 1))
+
+class JalaliDateTests(SimpleTestCase):
+    def test_int_round_trip(self):
+        date = jalali.JalaliDate(1404, 6, 4)
+        self.assertEqual(date.as_int, 14040604)
+        self.assertEqual(jalali.JalaliDate.from_int(date.as_int), date)
+
+    def test_copy_and_pickle(self):
+        date = jalali.JalaliDate(1404, 6, 4)
+        self.assertEqual(copy.deepcopy(date), date)
+        self.assertEqual(pickle.loads(pickle.dumps(date)), date)
+
+class JalaliDateFieldTests(TestCase):
+    """Dates are stored as YYYYMMDD integers, so year, month and day lookups are arithmetic on the column."""
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=manager)
+        cls.activities = {
+            date: create_activity(employee, manager, start_date=date, end_date=date)
+            for date in (jalali.JalaliDate(1403, 12, 30), jalali.JalaliDate(1404, 1, 1), jalali.JalaliDate(1404, 11, 1))
+        }
+
+    def dates(self, **lookup):
+        return sorted(activity.start_date for activity in models.Activity.objects.filter(**lookup))
+
+    def test_lookups(self):
+        self.assertEqual(self.dates(start_date__year=1404), [jalali.JalaliDate(1404, 1, 1), jalali.JalaliDate(1404, 11, 1)])
+        self.assertEqual(self.dates(start_date__month=12), [jalali.JalaliDate(1403, 12, 30)])
+        self.assertEqual(self.dates(start_date__day=1), [jalali.JalaliDate(1404, 1, 1), jalali.JalaliDate(1404, 11, 1)])
+        self.assertEqual(self.dates(start_date__year=1404, start_date__month__gte=2), [jalali.JalaliDate(1404, 11, 1)])
+        self.assertEqual(self.dates(start_date__gte='1404/01/01'), [jalali.JalaliDate(1404, 1, 1), jalali.JalaliDate(1404, 11, 1)])
+
+    def test_form_field(self):
+        field = fields.JalaliDateFormField(required=False)
+        self.assertEqual(field.clean('1404/6/4'), jalali.JalaliDate(1404, 6, 4))
+        self.assertIsNone(field.clean(''))
+        self.assertEqual(field.prepare_value(jalali.JalaliDate(1404, 6, 4)), '1404/06/04')
+        for value in ('1404/12/30', '1404-13-01', 'تاریخ'):
+            with self.assertRaises(ValidationError):
+                field.clean(value)
+
+class JalaliDateMigrationTests(TransactionTestCase):
+    """Migration 0014 turns the old text dates into integers and back, emptying the invalid ones."""
+
+    before = [('app', '0013_activity_window')]
+    after = [('app', '0014_jalali_date_fields')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_text_dates_are_converted(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('app', 'CustomUser').objects.create(username='employee', user_type='3')
+        pk = apps.get_model('app', 'Activity').objects.create(
+            user=user, creater=user, title='فعالیت', body='توضیحات', sensitivity='1', visibility=True,
+            start_date='1404/1/5', start_time=datetime.time(8, 0), end_date='1404/13/01', end_time=datetime.time(17, 0),
+        ).pk
+
+        with self.assertLogs('app.migrations.0014_jalali_date_fields', 'WARNING') as logs:
+            apps = self.migrate(self.after)
+        self.assertIn('1404/13/01', logs.output[0])
+        activity = apps.get_model('app', 'Activity').objects.get(pk=pk)
+        self.assertEqual((activity.start_date, activity.end_date), (jalali.JalaliDate(1404, 1, 5), None))
+
+        apps = self.migrate(self.before)
+        activity = apps.get_model('app', 'Activity').objects.get(pk=pk)
+        self.assertEqual((activity.start_date, activity.end_date), ('1404/01/05', ''))
+
+class JalaliConversionTests(SimpleTestCase):
+    """Checks the table-driven engine against the previous formula over 300 years."""
+
+    START = datetime.date(1880, 1, 1)
+    END = datetime.date(2180, 1, 1)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.legacy = {}
+        day = cls.START - ONE_DAY
+        while day < cls.END:
+            cls.legacy[day] = legacy_to_persian(day.year, day.month, day.day)
+            day += ONE_DAY
+
+        # فرمول قبلی در چند سال (مثل 1900 و 2100) یک روز را تکرار یا جا می اندازد؛
+        # از آن روز تا نوروز بعدی با تقویم پیوسته قابل مقایسه نیست.
+        cls.legacy_defects = set()
+        broken = False
+        day = cls.START
+        while day < cls.END:
+            if cls.legacy[day][1:] == (1, 1):
+                broken = False
+            if not is_next_day(cls.legacy[day - ONE_DAY], cls.legacy[day]):
+                broken = True
+            if broken:
+                cls.legacy_defects.add(day)
+            day += ONE_DAY
+
+    def test_legacy_defects_are_rare(self):
+        self.assertLess(len(self.legacy_defects), 200)
+
+    def test_gregorian_to_persian_matches_legacy(self):
+        mismatches = [
+            day for day, expected in self.legacy.items()
+            if day >= self.START and jalali.Gregorian(day).persian_tuple() != expected and day not in self.legacy_defects
+        ]
+        self.assertEqual(mismatches, [])
+
+    def test_persian_to_gregorian_matches_legacy(self):
+        mismatches = []
+        for year in range(1259, 1559):
+            for month in range(1, 13):
+                for day in range(1, jalali.month_length(year, month) + 1):
+                    converted = jalali.Persian(year, month, day).gregorian_datetime()
+                    try:
+                        expected = datetime.date(*legacy_to_gregorian(year, month, day))
+                    except ValueError:
+                        continue
+                    if converted == expected or converted in self.legacy_defects or expected in self.legacy_defects:
+                        continue
+                    if legacy_to_persian(expected.year, expected.month, expected.day) != (year, month, day):
+                        continue
+                    mismatches.append((year, month, day))
+        self.assertEqual(mismatches, [])
+
+    def test_conversion_is_contiguous_and_reversible(self):
+        previous = None
+        day = self.START
+        while day < self.END:
+            current = jalali.Gregorian(day).persian_tuple()
+            if previous is not None:
+                self.assertTrue(is_next_day(previous, current), (day, previous, current))
+            self.assertEqual(jalali.Persian(current).gregorian_datetime(), day)
+            previous = current
+            day += ONE_DAY
+
+    def test_string_input_and_validation(self):
+        self.assertEqual(jalali.Persian('1404/06/04').gregorian_tuple(), (2025, 8, 26))
+        self.assertEqual(jalali.Gregorian('2025-8-26').persian_string('{}/{}/{}'), '1404/6/4')
+        self.assertEqual(jalali.JalaliDate.parse('1403/12/30').to_gregorian(), datetime.date(2025, 3, 20))
+        with self.assertRaises(ValueError):
+            jalali.JalaliDate.parse('1404/12/30')
+        with self.assertRaises(Exception):
+            jalali.Persian('1404-13-01')
+        with self.assertRaises(Exception):
+            jalali.Gregorian(2025, 2, 29)
+
+    def test_batch_matches_single_conversion(self):
+        days = [self.START + ONE_DAY * offset for offset in range(0, 109500, 97)]
+        persian = jalali.to_persian_many(days)
+        self.assertEqual(persian, [jalali.Gregorian(day).persian_tuple() for day in days])
+        self.assertEqual(jalali.to_gregorian_many(persian), days)
+
+    @unittest.skipIf(jalali.np is None, 'numpy is not installed')
+    def test_numpy_batch_matches_single_conversion(self):
+        np = jalali.np
+        days = np.arange('1800-01-01', '2250-01-01', dtype='datetime64[D]')
+        persian = jalali.to_persian_many(days)
+        expected = [jalali.from_day_number(day.toordinal()) for day in days.astype(object)]
+        self.assertEqual([tuple(row) for row in persian.tolist()], expected)
+        inside = (days >= np.datetime64('1831-03-21')) & (days < np.datetime64('2199-03-21'))
+        self.assertTrue((jalali.to_gregorian_many(persian[inside]) == days[inside]).all())
+
+# --- chat ---
+
+class ChatRenderQueryTests(TestCase):
+    """Rendering a chat page or fragment costs the same number of queries for any number of messages."""
+
+    SIZES = (1, 50, 500)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.super_admin = models.CustomUser.objects.create_user('admin', password='x', user_type='1')
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=cls.manager)
+        cls.conversations = {}
+        for size in cls.SIZES:
+            conversation = models.Conversation.objects.create()
+            conversation.users.add(cls.manager, cls.employee)
+            senders = (cls.manager, cls.employee, cls.super_admin)
+            models.Message.objects.bulk_create([
+                models.Message(conversation=conversation, user=senders[i % 3], body=f'message {i}')
+                for i in range(size)
+            ])
+            cls.conversations[size] = conversation
+
+    def query_counts(self, user, url_name, query=''):
+        self.client.force_login(user)
+        counts = {}
+        for size, conversation in self.conversations.items():
+            url = reverse(url_name, kwargs={'pk': conversation.pk}) + query
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts[size] = len(captured)
+        return counts
+
+    def assertConstant(self, counts):
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_chat_page(self):
+        self.assertConstant(self.query_counts(self.employee, 'chat'))
+
+    def test_new_messages_fragment(self):
+        self.assertConstant(self.query_counts(self.employee, 'update_chat', '?after_id=0'))
+
+    def test_message_history(self):
+        self.assertConstant(self.query_counts(self.employee, 'message_history', '?before_id=999999999'))
+
+    def test_fragment_for_non_participant_shows_senders(self):
+        counts = self.query_counts(self.super_admin, 'update_chat', '?after_id=0')
+        self.assertConstant(counts)
+        response = self.client.get(reverse('update_chat', kwargs={'pk': self.conversations[50].pk}) + '?after_id=0')
+        self.assertContains(response, f'{self.manager} :')
+
+    def test_renamed_sender_is_rendered(self):
+        self.client.force_login(self.super_admin)
+        url = reverse('update_chat', kwargs={'pk': self.conversations[1].pk}) + '?after_id=0'
+        self.assertContains(self.client.get(url), f'{self.manager} :')
+
+        self.manager.first_name = 'نام جدید'
+        self.manager.save()
+        self.assertContains(self.client.get(url), f'{self.manager} :')
+
+    def test_invalid_cursor_is_a_bad_request(self):
+        self.client.force_login(self.employee)
+        pk = self.conversations[1].pk
+        for url_name, query in (
+            ('update_chat', '?after_id=abc'),
+            ('message_history', '?before_id=abc'),
+        ):
+            with self.subTest(url_name=url_name, query=query):
+                response = self.client.get(reverse(url_name, kwargs={'pk': pk}) + query)
+                self.assertEqual(response.status_code, 400)
+
+    def test_message_history_pages_with_the_cursor(self):
+        self.client.force_login(self.employee)
+        conversation = self.conversations[500]
+        url = reverse('message_history', kwargs={'pk': conversation.pk})
+        ids = list(conversation.conversation_messages.order_by('-id').values_list('id', flat=True))
+
+        page = self.client.get(url, {'limit': 100}).json()
+        self.assertEqual([record['id'] for record in page['messages']], ids[:100][::-1])
+        self.assertTrue(page['has_more'])
+        self.assertEqual(page['next_before_id'], ids[99])
+
+        page = self.client.get(url, {'limit': 100, 'before_id': page['next_before_id']}).json()
+        self.assertEqual([record['id'] for record in page['messages']], ids[100:200][::-1])
+
+        page = self.client.get(url, {'limit': 100, 'before_id': ids[-50]}).json()
+        self.assertEqual(len(page['messages']), 49)
+        self.assertFalse(page['has_more'])
+        self.assertIsNone(page['next_before_id'])
+
+    def test_message_markup_stays_compact(self):
+        # پیش از sprite آیکن ها و منوی درون هر پیام، هر پیام حدود 2400 بایت بود (بنچمارک، صفحه 50 پیامی)
+        baseline_bytes_per_message = 2400
+        self.client.force_login(self.employee)
+        sizes = {}
+        for size in (1, 50):
+            url = reverse('update_chat', kwargs={'pk': self.conversations[size].pk}) + '?after_id=0'
+            sizes[size] = self.client.get(url).content
+        self.assertLess((len(sizes[50]) - len(sizes[1])) / 49, baseline_bytes_per_message / 2)
+        self.assertNotIn(b'<path', sizes[50])
+        self.assertNotIn(b'csrfmiddlewaretoken', sizes[50])
+
+    def test_chat_groups_by_local_day(self):
+        conversation = self.conversations[1]
+        # ۲۲:۰۰ به وقت UTC در تهران روز بعد است
+        conversation.conversation_messages.update(created_at=datetime.datetime(2024, 1, 1, 22, tzinfo=datetime.timezone.utc))
+        self.client.force_login(self.employee)
+        response = self.client.get(reverse('chat', kwargs={'pk': conversation.pk}))
+        self.assertEqual(response.context['messages_by_day'][0]['date'], views.persian_date(datetime.date(2024, 1, 2)))
+
+class ChatPushTests(TestCase):
+    """The long-poll version is read from the database, so every worker process sees the same value."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=cls.manager)
+        cls.conversation = models.Conversation.objects.create()
+        cls.conversation.users.add(cls.manager, cls.employee)
+
+    def test_version_survives_a_cold_cache(self):
+        events.notify(self.conversation.pk)
+        cache.clear()
+        self.assertEqual(events.get_version(self.conversation.pk), 1)
+        self.assertEqual(async_to_sync(events.wait_for_change)(self.conversation.pk, 0, timeout=0), 1)
+
+    def test_message_and_read_receipt_bump_the_version(self):
+        self.client.force_login(self.employee)
+        self.client.post(reverse('add_chat', kwargs={'pk': self.conversation.pk}), {'body': 'hello'})
+        self.assertEqual(events.get_version(self.conversation.pk), 1)
+
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('chat', kwargs={'pk': self.conversation.pk}))
+        self.assertEqual(events.get_version(self.conversation.pk), 2)
+        self.assertEqual(response.context['chat_version'], 2)
+
+    def test_etag_depends_on_the_query(self):
+        self.client.force_login(self.employee)
+        url = reverse('update_chat', kwargs={'pk': self.conversation.pk})
+        etag = self.client.get(url + '?after_id=0')['ETag']
+        self.assertEqual(self.client.get(url + '?after_id=0', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url + '?after_id=5', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+class DirectConversationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=cls.manager)
+
+    def test_get_or_create_direct_is_idempotent_and_order_independent(self):
+        conversation = models.Conversation.objects.get_or_create_direct(self.manager, self.employee)
+        self.assertEqual(set(conversation.users.all()), {self.manager, self.employee})
+        self.assertEqual(models.Conversation.objects.get_or_create_direct(self.manager, self.employee), conversation)
+        self.assertEqual(models.Conversation.objects.get_or_create_direct(self.employee, self.manager), conversation)
+        self.assertEqual(models.Conversation.objects.count(), 1)
+        self.assertEqual(conversation.participants_key, models.Conversation.direct_key(self.employee.pk, self.manager.pk))
+
+    def test_migration_merges_duplicates_and_recounts(self):
+        migration = importlib.import_module('app.migrations.0009_conversation_participants_key')
+        kept, duplicate = models.Conversation.objects.create(), models.Conversation.objects.create()
+        for conversation in (kept, duplicate):
+            conversation.users.add(self.manager, self.employee)
+        read = models.Message.objects.create(conversation=kept, user=self.employee, body='1')
+        models.Message.objects.create(conversation=duplicate, user=self.employee, body='2')
+        models.Message.objects.create(conversation=duplicate, user=self.manager, body='3')
+        models.ReadState.objects.all().delete()
+        models.ReadState.objects.create(user=self.manager, conversation=kept, last_read_message_id=read.id)
+
+        migration.dedupe_direct_conversations(django_apps, None)
+
+        self.assertEqual(list(models.Conversation.objects.all()), [kept])
+        self.assertEqual(kept.conversation_messages.count(), 3)
+        counts = dict(models.ReadState.objects.filter(conversation=kept).values_list('user', 'unread_count'))
+        self.assertEqual(counts, {self.manager.pk: 1, self.employee.pk: 1})
+
+class ReadStateTests(TestCase):
+    """Unread counters follow new, deleted and read messages; the cached badge is dropped on every change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=cls.manager)
+        cls.conversation = models.Conversation.objects.create()
+        cls.conversation.users.add(cls.manager, cls.employee)
+
+    def setUp(self):
+        cache.clear()
+
+    def send(self, user, body='hello', conversation=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return models.Message.objects.create(conversation=conversation or self.conversation, user=user, body=body)
+
+    def unread(self, user):
+        return models.ReadState.objects.get(user=user, conversation=self.conversation).unread_count
+
+    def test_message_created_counts_for_recipients_only(self):
+        self.send(self.employee)
+        self.send(self.employee)
+        self.assertEqual(self.unread(self.manager), 2)
+        self.assertFalse(models.ReadState.objects.filter(user=self.employee, unread_count__gt=0).exists())
+
+    def test_message_deleted_only_counts_unread_messages(self):
+        first = self.send(self.employee)
+        models.ReadState.objects.mark_read(self.manager, self.conversation, first.id)
+        second = self.send(self.employee)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.unread(self.manager), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.unread(self.manager), 0)
+
+    def test_deleting_the_sender_uncounts_their_messages(self):
+        sender = models.CustomUser.objects.create_user('sender', password='x', user_type='3')
+        self.conversation.users.add(sender)
+        self.send(sender)
+        self.send(self.employee)
+        self.assertEqual(models.ReadState.objects.unread_total(self.manager), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sender.delete()
+        self.assertEqual(self.unread(self.manager), 1)
+        self.assertEqual(models.ReadState.objects.unread_total(self.manager), 1)
+
+    def test_deleting_the_conversation_clears_the_badge(self):
+        other = models.Conversation.objects.create()
+        other.users.add(self.manager, self.employee)
+        self.send(self.employee)
+        self.send(self.employee, conversation=other)
+        self.assertEqual(models.ReadState.objects.unread_total(self.manager), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(models.ReadState.objects.unread_total(self.manager), 1)
+
+    def test_super_admin_list_counts_unseen_messages(self):
+        super_admin = models.CustomUser.objects.create_user('admin', password='x', user_type='1')
+        first = self.send(self.employee)
+        self.send(self.employee)
+        self.send(super_admin)
+        models.ReadState.objects.mark_read(self.manager, self.conversation, first.id)
+
+        self.client.force_login(super_admin)
+        response = self.client.get(reverse('super_admin_tickets'))
+        self.assertEqual(response.context['unseen_counts'], {self.conversation.id: 1})
+
+    def test_mark_read_keeps_messages_after_the_watermark(self):
+        first = self.send(self.employee)
+        # پیامی که بعد از خواندن صفحه و پیش از ثبت وضعیت خواندن می رسد
+        self.send(self.employee)
+        models.ReadState.objects.mark_read(self.manager, self.conversation, first.id)
+        self.assertEqual(self.unread(self.manager), 1)
+
+    def test_mark_read_never_moves_the_watermark_back(self):
+        self.send(self.employee)
+        last = self.send(self.employee)
+        models.ReadState.objects.mark_read(self.manager, self.conversation, last.id)
+        models.ReadState.objects.mark_read(self.manager, self.conversation, last.id - 1)
+        read_state = models.ReadState.objects.get(user=self.manager, conversation=self.conversation)
+        self.assertEqual((read_state.last_read_message_id, read_state.unread_count), (last.id, 0))
+
+    def test_mark_read_without_earlier_state(self):
+        message = models.Message.objects.create(conversation=self.conversation, user=self.employee, body='hello')
+        models.ReadState.objects.mark_read(self.manager, self.conversation, message.id)
+        self.assertEqual(self.unread(self.manager), 0)
+
+    def test_unread_total_is_cached_until_a_change(self):
+        self.send(self.employee)
+        self.assertEqual(models.ReadState.objects.unread_total(self.manager), 1)
+        # تنها پرس و جو خواندن از جدول کش است
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(models.ReadState.objects.unread_total(self.manager), 1)
+        self.assertFalse([query for query in queries if 'app_readstate' in query['sql']])
+
+        self.send(self.employee)
+        self.assertEqual(models.ReadState.objects.unread_total(self.manager), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.ReadState.objects.mark_read(self.manager, self.conversation, models.Message.objects.latest('id').id)
+        self.assertEqual(models.ReadState.objects.unread_total(self.manager), 0)
+
+# --- search ---
+
+def create_activity(user, creater, **fields):
+    today = jalali.JalaliDate.today()
+    return models.Activity.objects.create(**{
+        'user': user,
+        'creater': creater,
+        'title': 'فعالیت',
+        'body': 'توضیحات',
+        'start_date': today,
+        'start_time': datetime.time(8, 0),
+        'end_date': today,
+        'end_time': datetime.time(17, 0),
+        'sensitivity': '1',
+        'visibility': True,
+        **fields,
+    })
+
+class NormalizerTests(SimpleTestCase):
+    def test_arabic_letter_variants(self):
+        self.assertEqual(normalizer.normalize('علي كريمي'), 'علی کریمی')
+        self.assertEqual(normalizer.normalize('مدرسة أمير'), 'مدرسه امیر')
+
+    def test_persian_and_arabic_digits(self):
+        self.assertEqual(normalizer.normalize('۱۴۰۲ ١٤٠٢'), '1402 1402')
+
+    def test_zwnj_diacritics_and_kashida(self):
+        self.assertEqual(normalizer.normalize('می‌خواهم'), 'می خواهم')
+        self.assertEqual(normalizer.normalize('کِتابـــ'), 'کتاب')
+
+    def test_tokenize(self):
+        self.assertEqual(normalizer.tokenize('  Hello,\n دنيا! '), ['hello', 'دنیا'])
+        self.assertEqual(normalizer.tokenize(' ؟! '), [])
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.super_admin = models.CustomUser.objects.create_user('admin', password='x', user_type='1')
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=cls.manager)
+        cls.outsider = models.CustomUser.objects.create_user('outsider', password='x', user_type='3', manager=cls.manager)
+        cls.conversation = models.Conversation.objects.create()
+        cls.conversation.users.add(cls.manager, cls.employee)
+
+    def search_messages(self, user, query):
+        return list(search.search_messages(user, query))
+
+    def indexed(self, table, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {table} WHERE rowid = %s', [pk])
+            return cursor.fetchone()[0] == 1
+
+    def test_message_index_follows_save_and_delete(self):
+        message = models.Message.objects.create(conversation=self.conversation, user=self.employee, body='گزارش ماهانه')
+        self.assertEqual(self.search_messages(self.manager, 'ماهانه'), [message])
+
+        message.body = 'گزارش هفتگی'
+        message.save()
+        self.assertEqual(self.search_messages(self.manager, 'ماهانه'), [])
+        self.assertEqual(self.search_messages(self.manager, 'هفتگی'), [message])
+
+        message.delete()
+        self.assertFalse(self.indexed(search.MESSAGE_INDEX, message.pk))
+
+    def test_query_and_document_are_normalized(self):
+        message = models.Message.objects.create(conversation=self.conversation, user=self.employee, body='كتاب سال ۱۴۰۲')
+        self.assertEqual(self.search_messages(self.manager, 'کتاب'), [message])
+        self.assertEqual(self.search_messages(self.manager, '1402'), [message])
+        self.assertEqual(self.search_messages(self.manager, '!!'), [])
+
+    def test_message_results_per_role(self):
+        message = models.Message.objects.create(conversation=self.conversation, user=self.employee, body='جلسه فردا')
+        for user, expected in (
+            (self.manager, [message]),
+            (self.employee, [message]),
+            (self.outsider, []),
+            (self.super_admin, []),
+        ):
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                response = self.client.get(reverse('search_messages'), {'q': 'جلسه'})
+                self.assertEqual(list(response.context['results']), expected)
+
+    def test_user_index_follows_save_and_delete(self):
+        user = models.CustomUser.objects.create_user('ali.ahmadi', password='x', first_name='علی', last_name='احمدی', user_type='3')
+        users = models.CustomUser.objects.all()
+        self.assertEqual(list(search.search_users_by_name(users, 'احمدی')), [user])
+        self.assertEqual(list(search.search_users_by_username(users, 'ali')), [user])
+
+        user.last_name = 'رضایی'
+        user.save()
+        self.assertEqual(list(search.search_users_by_name(users, 'احمدی')), [])
+        self.assertEqual(list(search.search_users_by_name(users, 'رضايي')), [user])
+
+        pk = user.pk
+        user.delete()
+        self.assertFalse(self.indexed(search.USER_INDEX, pk))
+
+    def test_activity_index_follows_save_delete_and_bulk_assign(self):
+        activity = create_activity(self.employee, self.manager, title='بازدید انبار')
+        activities = models.Activity.objects.all()
+        self.assertEqual(list(search.search_activities(activities, 'انبار')), [activity])
+
+        activity.delete()
+        self.assertEqual(list(search.search_activities(activities, 'انبار')), [])
+
+        today = jalali.JalaliDate.today()
+        models.Activity.objects.bulk_assign(
+            [self.employee.pk, self.outsider.pk], creater=self.manager, title='تحویل کالا', body='x',
+            start_date=today, start_time=datetime.time(8, 0), end_date=today, end_time=datetime.time(17, 0),
+            sensitivity='1', visibility=True,
+        )
+        self.assertEqual(search.search_activities(activities, 'کالا').count(), 2)
+
+    def test_matching_is_token_prefix(self):
+        # جستجو از ابتدای هر کلمه تطبیق می دهد؛ تکه ای از وسط کلمه دیگر پیدا نمی شود
+        user = models.CustomUser.objects.create_user('ahmadi', password='x', first_name='علی', last_name='احمدی', user_type='3')
+        users = models.CustomUser.objects.all()
+        self.assertEqual(list(search.search_users_by_name(users, 'احم')), [user])
+        self.assertEqual(list(search.search_users_by_name(users, 'حمدی')), [])
+        self.assertEqual(list(search.search_users_by_username(users, 'ahm')), [user])
+        self.assertEqual(list(search.search_users_by_username(users, 'madi')), [])
+
+        activity = create_activity(self.employee, self.manager, title='بازرسی')
+        self.assertEqual(list(search.search_activities(models.Activity.objects.all(), 'باز')), [activity])
+        self.assertEqual(list(search.search_activities(models.Activity.objects.all(), 'رسی')), [])
+
+# --- files ---
+
+class MessageFileTests(TestCase):
+    """Identical attachments share one stored file, which is deleted with its last reference."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3')
+        cls.conversation = models.Conversation.objects.create()
+        cls.conversation.users.add(cls.employee)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = self.settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def attach(self, content=b'report'):
+        return models.Message.objects.create(
+            conversation=self.conversation, user=self.employee, body='file', file=ContentFile(content, name='report.txt'),
+        )
+
+    def ref_count(self, name):
+        return models.FileBlob.objects.filter(name=name).values_list('ref_count', flat=True).first()
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.attach(), self.attach()
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(self.ref_count(first.file.name), 2)
+        self.assertNotEqual(self.attach(b'other').file.name, first.file.name)
+
+    def test_file_is_deleted_with_the_last_reference(self):
+        first, second = self.attach(), self.attach()
+        name, storage = first.file.name, first.file.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.ref_count(name), 1)
+        self.assertTrue(storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertIsNone(self.ref_count(name))
+        self.assertFalse(storage.exists(name))
+
+    def test_file_referenced_again_before_commit_is_kept(self):
+        message = self.attach()
+        name, storage = message.file.name, message.file.storage
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            message.delete()
+        self.attach()
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.ref_count(name), 1)
+        self.assertTrue(storage.exists(name))
+
+    def test_storage_save_takes_the_reference_before_the_message_exists(self):
+        message = self.attach()
+        name, storage = message.file.name, message.file.storage
+        with self.captureOnCommitCallbacks() as callbacks:
+            message.delete()
+
+        # نام فایل موجود برگردانده شده ولی پیام هنوز ذخیره نشده که delete_unused اجرا می شود
+        self.assertEqual(storage.save('message/report.txt', ContentFile(b'report')), name)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.ref_count(name), 1)
+        self.assertTrue(storage.exists(name))
+
+# --- images ---
+
+def jpeg(size=(3000, 2000), orientation=None):
+    image = Image.new('RGB', size, 'white')
+    exif = Image.Exif()
+    exif[0x0110] = 'Camera'  # Model
+    if orientation:
+        exif[0x0112] = orientation
+    output = BytesIO()
+    image.save(output, format='JPEG', exif=exif)
+    return ContentFile(output.getvalue(), name='card.jpg')
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ProfileImageTests(TestCase):
+    """Profile images get EXIF-free derivatives, which are removed when the image is replaced or the profile deleted."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3')
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = self.settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def create_profile(self, national_card):
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = models.Profile.objects.create(
+                user=self.employee, phone_number='09120000000', address='تهران',
+                phone_number_1='09120000001', phone_number_2='09120000002', national_code='0000000000',
+                birthdate=jalali.JalaliDate(1370, 1, 1), national_card=national_card,
+            )
+        return models.Profile.objects.get(pk=profile.pk)
+
+    def derivatives(self, profile):
+        return [getattr(profile, images.derivative_field('national_card', derivative)) for derivative in images.DERIVATIVE_SIZES]
+
+    def test_derivative_sizes_and_exif(self):
+        profile = self.create_profile(jpeg(orientation=6))
+        for field, size in zip(self.derivatives(profile), images.DERIVATIVE_SIZES.values()):
+            with field.open('rb') as file, Image.open(file) as image:
+                # جهت تصویر اعمال شده و عرض و ارتفاع جابجا شده است
+                self.assertEqual(image.height, size[1])
+                self.assertEqual(image.width, round(size[1] * 2 / 3))
+                self.assertEqual(dict(image.getexif()), {})
+
+    def test_small_images_are_not_upscaled(self):
+        profile = self.create_profile(jpeg(size=(300, 200)))
+        for field in self.derivatives(profile):
+            with field.open('rb') as file, Image.open(file) as image:
+                self.assertEqual(image.size, (300, 200))
+
+    def test_replacing_the_image_deletes_old_derivatives(self):
+        profile = self.create_profile(jpeg())
+        old = [(field.storage, field.name) for field in self.derivatives(profile)]
+
+        profile.national_card = jpeg(size=(1000, 1000))
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+
+        self.assertFalse(any(storage.exists(name) for storage, name in old))
+        profile.refresh_from_db()
+        self.assertTrue(all(field.storage.exists(field.name) for field in self.derivatives(profile)))
+
+    def test_deleting_the_profile_deletes_derivatives(self):
+        profile = self.create_profile(jpeg())
+        files = [(field.storage, field.name) for field in self.derivatives(profile)]
+        self.assertTrue(all(storage.exists(name) for storage, name in files))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.delete()
+        self.assertFalse(any(storage.exists(name) for storage, name in files))
+
+    def test_deferred_images_are_not_loaded(self):
+        profile = self.create_profile(jpeg())
+        files = [(field.storage, field.name) for field in self.derivatives(profile)]
+
+        partial = models.Profile.objects.only('id', 'status').get(pk=profile.pk)
+        self.assertEqual(len(list(models.Profile.objects.defer('guarantee'))), 1)
+        partial.status = '2'
+        with self.captureOnCommitCallbacks(execute=True):
+            partial.save()
+        self.assertTrue(all(storage.exists(name) for storage, name in files))
+
+        # فیلد deferred که بعدا خوانده شده ولی تغییری نکرده مشتق ها را از نو نمی سازد
+        partial = models.Profile.objects.defer('national_card').get(pk=profile.pk)
+        partial.national_card
+        with self.captureOnCommitCallbacks(execute=True):
+            partial.save()
+        self.assertTrue(all(storage.exists(name) for storage, name in files))
+
+        partial = models.Profile.objects.defer('national_card').get(pk=profile.pk)
+        partial.national_card = jpeg(size=(1000, 1000))
+        with self.captureOnCommitCallbacks(execute=True):
+            partial.save()
+        self.assertFalse(any(storage.exists(name) for storage, name in files))
+
+# --- background jobs ---
+
+class BackgroundJobTests(SimpleTestCase):
+    def test_jobs_need_a_shared_cache(self):
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertFalse(tasks.jobs_supported())
+        with tempfile.TemporaryDirectory() as location:
+            with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+                self.assertTrue(tasks.jobs_supported())
+
+    def test_default_cache_is_shared(self):
+        self.assertTrue(tasks.jobs_supported())
+
+class BulkAssignTests(TestCase):
+    """Bulk activities are inserted in batches inside one transaction and go to the background above the threshold."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.super_admin = models.CustomUser.objects.create_user('admin', password='x', user_type='1')
+        cls.employees = [models.CustomUser.objects.create_user(f'employee{i}', password='x', user_type='3') for i in range(5)]
+        cls.activity_data = {
+            'creater_id': cls.super_admin.pk, 'title': 'فعالیت', 'body': 'توضیحات',
+            'start_date': jalali.JalaliDate(1404, 1, 1), 'start_time': datetime.time(8, 0),
+            'end_date': jalali.JalaliDate(1404, 1, 2), 'end_time': datetime.time(17, 0),
+            'sensitivity': '1', 'visibility': True,
+        }
+
+    @override_settings(BULK_ACTIVITY_BATCH_SIZE=2)
+    def test_batches(self):
+        steps = []
+        with CaptureQueriesContext(connection) as queries:
+            total = models.Activity.objects.bulk_assign(
+                [user.pk for user in self.employees], progress=lambda done, total: steps.append((done, total)), **self.activity_data,
+            )
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "app_activity"')]
+        self.assertEqual(total, 5)
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(steps, [(2, 5), (4, 5), (5, 5)])
+        self.assertEqual(models.Activity.objects.count(), 5)
+
+    @override_settings(BULK_ACTIVITY_BATCH_SIZE=2)
+    def test_failure_rolls_back_every_batch(self):
+        def fail_on_last_batch(done, total):
+            if done == total:
+                raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            models.Activity.objects.bulk_assign([user.pk for user in self.employees], progress=fail_on_last_batch, **self.activity_data)
+        self.assertFalse(models.Activity.objects.exists())
+
+    @override_settings(BULK_ACTIVITY_BACKGROUND_THRESHOLD=2, BACKGROUND_TASKS_EAGER=True)
+    def test_large_assignment_runs_as_a_job(self):
+        self.client.force_login(self.super_admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('super_admin_add_activity'), {
+                'users': [user.pk for user in self.employees], 'title': 'فعالیت', 'body': 'توضیحات',
+                'start_date': '1404/01/01', 'start_time': '08:00', 'end_date': '1404/01/02', 'end_time': '17:00', 'sensitivity': '1',
+            })
+        job_id = response.url.rstrip('/').rsplit('/', 1)[1]
+        self.assertEqual(response.url, reverse('super_admin_activity_job', args=[job_id]))
+        self.assertEqual(tasks.get_job(job_id)['status'], 'done')
+        self.assertEqual(models.Activity.objects.count(), 5)
+
+# --- activity windows ---
+
+class ActivityWindowTests(TestCase):
+    """Window filters at their boundaries; activities without dates are in no window."""
+
+    # چهارشنبه؛ هفته با پایان جمعه تمام می شود
+    at = make_aware(datetime.datetime(2026, 10, 14, 12, 0))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=cls.manager)
+        # در هر سه آزمون در پایگاه داده هست و نباید در هیچ پنجره ای بیاید
+        cls.undated = create_activity(cls.employee, cls.manager, start_date=None, end_date=None)
+
+    def activity(self, starts_at, ends_at, **fields):
+        activity = create_activity(self.employee, self.manager, **fields)
+        models.Activity.objects.filter(pk=activity.pk).update(starts_at=starts_at, ends_at=ends_at)
+        return activity
+
+    def assertWindow(self, queryset, expected):
+        self.assertEqual(set(queryset), set(expected))
+
+    def test_active_includes_both_ends(self):
+        hour = datetime.timedelta(hours=1)
+        starting_now = self.activity(self.at, self.at + hour)
+        ending_now = self.activity(self.at - hour, self.at)
+        self.activity(self.at + hour, self.at + 2 * hour)
+        self.activity(self.at - 2 * hour, self.at - hour)
+        self.assertIsNone(self.undated.starts_at)
+        self.assertWindow(models.Activity.objects.active(self.at), [starting_now, ending_now])
+
+    def test_overdue_excludes_the_current_moment_and_completed(self):
+        minute = datetime.timedelta(minutes=1)
+        overdue = self.activity(self.at - 2 * minute, self.at - minute)
+        self.activity(self.at - 2 * minute, self.at - minute, is_completed=True)
+        self.activity(self.at - minute, self.at)
+        self.assertWindow(models.Activity.objects.overdue(self.at), [overdue])
+
+    def test_due_this_week_ends_on_friday(self):
+        start = self.at - datetime.timedelta(days=1)
+        saturday = make_aware(datetime.datetime(2026, 10, 17))
+        today = self.activity(start, self.at)
+        friday_night = self.activity(start, saturday - datetime.timedelta(seconds=1))
+        self.activity(start, saturday)
+        self.activity(start, self.at - datetime.timedelta(seconds=1))
+        self.activity(start, self.at, is_completed=True)
+        self.assertWindow(models.Activity.objects.due_this_week(self.at), [today, friday_night])
+
+        # روز جمعه پنجره فقط تا پایان همان روز است
+        friday = make_aware(datetime.datetime(2026, 10, 16, 23, 0))
+        self.assertWindow(models.Activity.objects.due_this_week(friday), [friday_night])
+
+# --- pagination ---
+
+class UserListing(pagination.KeysetPaginationMixin, ListView):
+    model = models.CustomUser
+    ordering = '-id'
+    paginate_by = 2
+    show_count = True
+
+class KeysetPaginationTests(TestCase):
+    """Cursors walk every row once in both directions, even when the visible sort keys are equal."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.super_admin = models.CustomUser.objects.create_user('admin', password='x', user_type='1')
+        # نام ها یکسان اند؛ ترتیب فقط با id تعیین می شود
+        for i in range(4):
+            models.CustomUser.objects.create_user(f'employee{i}', password='x', user_type='3', first_name='علی', last_name='رضایی')
+        cls.ids = list(models.CustomUser.objects.order_by('-id').values_list('pk', flat=True))
+
+    def page(self, query=''):
+        response = UserListing.as_view()(RequestFactory().get('/users/' + query))
+        return response.context_data['page_obj']
+
+    def test_next_and_previous_cursors(self):
+        pages, page = [], self.page()
+        self.assertFalse(page.has_previous())
+        while True:
+            pages.append([user.pk for user in page])
+            if not page.has_next():
+                break
+            page = self.page(page.next_page_url)
+        self.assertEqual([pk for rows in pages for pk in rows], self.ids)
+        self.assertEqual([len(rows) for rows in pages], [2, 2, 1])
+
+        for rows in reversed(pages[:-1]):
+            page = self.page(page.previous_page_url)
+            self.assertEqual([user.pk for user in page], rows)
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(Http404):
+            self.page('?after=abc')
+
+    def test_estimated_count(self):
+        self.assertEqual((self.page().count, self.page().count_is_capped), (5, False))
+        with self.settings(PAGINATION_COUNT_LIMIT=3):
+            self.assertEqual((self.page().count, self.page().count_is_capped), (3, True))
+
+    def test_search_without_tokens(self):
+        # جستجویی که پس از نرمال سازی خالی می شود کوئری none() می سازد
+        self.client.force_login(self.super_admin)
+        response = self.client.get(reverse('super_admin_users'), {'search_full_name': '!!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].count, 0)
+
+# --- compression ---
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Text responses are compressed with brotli when accepted, else gzip; small, binary and encoded ones pass through."""
+
+    body = ('<p>پیام</p>' * 100).encode()
+
+    def respond(self, accept_encoding, content=None, content_type='text/html; charset=utf-8', **headers):
+        def get_response(request):
+            return HttpResponse(self.body if content is None else content, content_type=content_type, headers={'ETag': '"v1"', **headers})
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware.CompressionMiddleware(get_response)(request)
+
+    @unittest.skipIf(middleware.brotli is None, 'brotli is not installed')
+    def test_brotli_when_accepted(self):
+        response = self.respond('gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_gzip_otherwise(self):
+        response = self.respond('gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        self.assertLess(len(response.content), len(self.body) / 10)
+
+    def test_pass_through(self):
+        cases = {
+            'small': (self.respond('gzip, br', content=b'<p>ok</p>'), b'<p>ok</p>'),
+            'binary': (self.respond('gzip, br', content_type='image/png'), self.body),
+            'encoded': (self.respond('gzip, br', **{'Content-Encoding': 'br'}), self.body),
+            'not accepted': (self.respond(''), self.body),
+        }
+        for name, (response, content) in cases.items():
+            with self.subTest(name):
+                self.assertEqual(response.content, content)
+                self.assertEqual(response['ETag'], '"v1"')
+
+# --- access ---
+
+class AccessScopeTests(TestCase):
+    """Each role sees and opens only the rows its queryset scope allows; missing rows are 404, foreign rows 403."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.super_admin = models.CustomUser.objects.create_user('admin', password='x', user_type='1')
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        cls.other_manager = models.CustomUser.objects.create_user('other_manager', password='x', user_type='2')
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=cls.manager)
+        cls.pending = models.CustomUser.objects.create_user('pending', password='x', user_type='3', manager=cls.manager)
+        cls.stranger = models.CustomUser.objects.create_user('stranger', password='x', user_type='3', manager=cls.other_manager)
+        for n, (user, status) in enumerate(((cls.employee, '2'), (cls.pending, '1'), (cls.stranger, '2'))):
+            models.Profile.objects.create(
+                user=user, status=status, phone_number=f'0912000000{n}', address='تهران',
+                phone_number_1='09120000010', phone_number_2='09120000020', national_code=f'000000000{n}',
+                birthdate=jalali.JalaliDate(1370, 1, 1), national_card='national_card/card.jpg',
+            )
+
+        cls.own_activity = create_activity(cls.manager, cls.super_admin)
+        cls.team_activity = create_activity(cls.employee, cls.manager)
+        cls.hidden_activity = create_activity(cls.employee, cls.manager, visibility=False)
+        cls.pending_activity = create_activity(cls.pending, cls.manager)
+        cls.foreign_activity = create_activity(cls.stranger, cls.other_manager)
+
+        cls.conversation = models.Conversation.objects.create()
+        cls.conversation.users.add(cls.manager, cls.employee)
+        cls.message = models.Message.objects.create(conversation=cls.conversation, user=cls.employee, body='سلام')
+
+    def test_user_visible_to(self):
+        users = models.CustomUser.objects
+        self.assertEqual(set(users.visible_to(self.super_admin)), set(users.all()))
+        self.assertEqual(set(users.visible_to(self.manager)), {self.employee})
+        self.assertEqual(set(users.visible_to(self.employee)), {self.employee})
+
+    def test_activity_scopes(self):
+        activities = models.Activity.objects
+        self.assertEqual(set(activities.of_team(self.manager)), {self.team_activity, self.hidden_activity})
+        self.assertEqual(
+            set(activities.managed_by(self.manager)),
+            {self.team_activity, self.hidden_activity, self.pending_activity},
+        )
+        self.assertEqual(set(activities.visible_to(self.super_admin)), set(activities.all()))
+        self.assertEqual(
+            set(activities.visible_to(self.manager)),
+            {self.own_activity, self.team_activity, self.hidden_activity, self.pending_activity},
+        )
+        self.assertEqual(set(activities.visible_to(self.employee)), {self.team_activity})
+        self.assertEqual(set(activities.visible_to(self.stranger)), {self.foreign_activity})
+
+    def test_conversation_and_message_scopes(self):
+        for user, allowed in ((self.super_admin, True), (self.manager, True), (self.employee, True), (self.stranger, False)):
+            with self.subTest(user=user.username):
+                self.assertEqual(models.Conversation.objects.accessible_by(user).filter(pk=self.conversation.pk).exists(), allowed)
+        for user, allowed in ((self.super_admin, True), (self.manager, False), (self.employee, True), (self.stranger, False)):
+            with self.subTest(user=user.username):
+                self.assertEqual(models.Message.objects.editable_by(user).filter(pk=self.message.pk).exists(), allowed)
+
+    def assertStatus(self, user, url, status, method='get'):
+        self.client.force_login(user)
+        self.assertEqual(getattr(self.client, method)(url).status_code, status)
+
+    def test_manager_activity_detail(self):
+        url = lambda activity_id: reverse('manager_activity', kwargs={'pk': activity_id})
+        self.assertStatus(self.manager, url(self.team_activity.pk), 200)
+        self.assertStatus(self.manager, url(self.pending_activity.pk), 200)
+        self.assertStatus(self.manager, url(self.foreign_activity.pk), 403)
+        self.assertStatus(self.manager, url(999999), 404)
+        self.assertStatus(self.employee, url(self.team_activity.pk), 403)
+
+    def test_conversation_access(self):
+        url = reverse('chat', kwargs={'pk': self.conversation.pk})
+        self.assertStatus(self.super_admin, url, 200)
+        self.assertStatus(self.employee, url, 200)
+        self.assertStatus(self.stranger, url, 403)
+        self.assertStatus(self.stranger, reverse('chat', kwargs={'pk': 999999}), 404)
+
+    def test_message_owner_access(self):
+        url = reverse('edit_chat', kwargs={'pk': self.message.pk})
+        self.assertStatus(self.manager, url, 403, 'post')
+        self.assertStatus(self.employee, url, 302, 'post')
+        self.assertStatus(self.super_admin, url, 302, 'post')
+        self.assertStatus(self.employee, reverse('edit_chat', kwargs={'pk': 999999}), 404, 'post')
+
+# --- dashboard stats ---
+
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+
+    def setUp(self):
+        cache.clear()
+
+    def saved(self, **kwargs):
+        generation = stats._generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manager.save(**kwargs)
+        return stats._generation() != generation
+
+    def test_login_keeps_the_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            generation = stats._generation()
+            self.client.login(username='manager', password='x')
+        self.assertEqual(stats._generation(), generation)
+        self.assertFalse(self.saved(update_fields=['last_login']))
+
+    def test_counted_fields_invalidate(self):
+        self.assertTrue(self.saved(update_fields=['user_type']))
+        self.assertTrue(self.saved(update_fields=['manager_id']))
+        self.assertTrue(self.saved())
+
+# --- query plans ---
+
+FULL_SCAN = re.compile(r'\bSCAN (\w+)$')
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class QueryPlanTests(TestCase):
+    """The hot view queries are answered from indexes, never by scanning a whole table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.super_admin = models.CustomUser.objects.create_user('admin', password='x', user_type='1')
+        cls.manager = models.CustomUser.objects.create_user('manager', password='x', user_type='2')
+        cls.employee = models.CustomUser.objects.create_user('employee', password='x', user_type='3', manager=cls.manager)
+        cls.conversation = models.Conversation.objects.create()
+        cls.conversation.users.add(cls.manager, cls.employee)
+
+    def hot_queries(self):
+        Message, Activity = models.Message.objects, models.Activity.objects
+        conversation, manager, employee = self.conversation, self.manager, self.employee
+        return {
+            'chat_messages': Message.filter(conversation=conversation).select_related('user').with_seen().order_by('-id')[:50],
+            'new_messages': Message.filter(conversation=conversation, id__gt=0).with_seen().order_by('id'),
+            'older_messages': Message.filter(conversation=conversation, id__lt=10 ** 9).with_seen().order_by('-id')[:51],
+            'unread_messages': Message.filter(conversation=conversation).unread_by(employee),
+            'unread_total': models.ReadState.objects.filter(user=employee, unread_count__gt=0),
+            'tickets': models.Conversation.objects.accessible_by(employee).with_unread_count(employee).order_by('-id')[:101],
+            'employee_activities': Activity.visible_to(employee).filter(user=employee).order_by('-id')[:101],
+            'manager_my_activities': Activity.visible_to(manager).filter(user=manager).order_by('-id')[:101],
+            'manager_team_activities': Activity.of_team(manager).filter(visibility=True).order_by('-id')[:101],
+            'manager_hidden_activities': Activity.filter(creater=manager, visibility=False),
+            'manager_team': models.CustomUser.objects.team_of(manager).order_by('-id')[:101],
+        }
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                scans = [line for line in plan.splitlines() if FULL_SCAN.search(line.strip())]
+                self.assertEqual(scans, [], plan)
+
+# --- sqlite ---
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite specific')
+class SQLiteConcurrencyTests(SimpleTestCase):
+    """Concurrent read-then-write transactions against a file database with the tuned options."""
+
+    WRITERS = 6
+    ROUNDS = 20
+
+    def open(self, path, options):
+        # اتصال مستقل با همان تنظیمات default؛ BEGIN مثل transaction.atomic از transaction_mode پیروی می کند
+        db = DatabaseWrapper({**connections.settings['default'], 'NAME': path, 'OPTIONS': options}, alias='sqlite_stress')
+        db.ensure_connection()
+        return db
+
+    def run_writers(self, options):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'stress.sqlite3')
+
+        db = self.open(path, options)
+        with db.cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (id integer PRIMARY KEY, value integer NOT NULL)')
+            cursor.execute('INSERT INTO counter (id, value) VALUES (1, 0)')
+
+        # همه نویسنده ها در دور اول پیش از نوشتن با هم می خوانند
+        barrier = threading.Barrier(self.WRITERS)
+        errors = []
+
+        def writer():
+            db = self.open(path, options)
+            try:
+                for _ in range(self.ROUNDS):
+                    with db.cursor() as cursor:
+                        try:
+                            cursor.execute(f'BEGIN {db.transaction_mode or ""}')
+                            cursor.execute('SELECT value FROM counter WHERE id = 1')
+                            value = cursor.fetchone()[0]
+                            try:
+                                barrier.wait(timeout=0.2)
+                            except threading.BrokenBarrierError:
+                                pass
+                            cursor.execute('UPDATE counter SET value = %s WHERE id = 1', [value + 1])
+                            cursor.execute('COMMIT')
+                        except OperationalError as error:
+                            errors.append(error)
+                            if db.connection.in_transaction:
+                                cursor.execute('ROLLBACK')
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with db.cursor() as cursor:
+            cursor.execute('SELECT value FROM counter WHERE id = 1')
+            value = cursor.fetchone()[0]
+        db.close()
+        return errors, value
+
+    def test_new_connection_applies_the_pragmas(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        db = self.open(os.path.join(directory.name, 'pragmas.sqlite3'), settings.DATABASES['default']['OPTIONS'])
+        self.addCleanup(db.close)
+        with db.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout']})
+        self.assertEqual(db.transaction_mode, 'IMMEDIATE')
+
+    def test_tuned_options_serialize_writers(self):
+        errors, value = self.run_writers(settings.DATABASES['default']['OPTIONS'])
+        self.assertEqual(errors, [])
+        self.assertEqual(value, self.WRITERS * self.ROUNDS)
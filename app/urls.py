@@ -21,6 +21,7 @@ urlpatterns = [
     path('super-admin/profiles/<int:pk>/edit/', views.SuperAdminProfileUpdateView.as_view(), name='super_admin_edit_profile'),
     path('super-admin/activities/', views.SuperAdminActivityListView.as_view(), name='super_admin_activities'),
     path('super-admin/activities/add/', views.super_admin_create_bulk_activity, name='super_admin_add_activity'),
+    path('super-admin/activities/jobs/<str:job_id>/', views.super_admin_activity_job, name='super_admin_activity_job'),
     path('super-admin/activities/<int:pk>/', views.SuperAdminActivityDetailView.as_view(), name='super_admin_activity'),
     path('super-admin/activities/<int:pk>/edit/', views.SuperAdminActivityUpdateView.as_view(), name='super_admin_edit_activity'),
     path('super-admin/activities/<int:pk>/delete/', views.SuperAdminActivityDeleteView.as_view(), name='super_admin_delete_activity'),
@@ -37,6 +38,7 @@ urlpatterns = [
     path('manager/activities/my/<int:pk>/is-completed/', views.ManagerMyActivityUpdateView.as_view(), name='manager_edit_my_activity'),
     path('manager/activities/employee/', views.ManagerActivityListView.as_view(), name='manager_activities'),
     path('manager/activities/employee/add/', views.manager_create_bulk_activity, name='manager_add_activity'),
+    path('manager/activities/employee/jobs/<str:job_id>/', views.manager_activity_job, name='manager_activity_job'),
     path('manager/activities/employee/<int:pk>/', views.ManagerActivityDetailView.as_view(), name='manager_activity'),
     path('manager/tickets/', views.ManagerTicketListView.as_view(), name='manager_tickets'),
     path('manager/tickets/add/', views.ManagerTicketCreateOrRedirectView.as_view(), name='manager_add_ticket'),
@@ -55,9 +57,11 @@ urlpatterns = [
 
     # chat urls
 
+    path('chats/search/', views.search_messages, name='search_messages'),
     path('chats/<int:pk>/', views.chat, name='chat'),
     path('chats/<int:pk>/update/', views.update_chat, name='update_chat'),
-    path('chats/<int:pk>/load_older/', views.load_older_messages, name='load_older_messages'),
+    path('chats/<int:pk>/wait/', views.wait_chat, name='wait_chat'),
+    path('chats/<int:pk>/messages/', views.message_history, name='message_history'),
     path('chats/<int:pk>/add/', views.add_chat, name='add_chat'),
     path('chats/message/<int:pk>/edit/', views.edit_chat, name='edit_chat'),
     path('chats/message/<int:pk>/delete/', views.delete_chat, name='delete_chat'),
@@ -1,21 +1,28 @@
+import hashlib
 from collections import defaultdict
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render, redirect
 from django.urls import reverse, reverse_lazy
+from django.utils.functional import SimpleLazyObject
+from django.utils.timezone import localtime
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.views.generic import ListView, CreateView, DetailView, UpdateView, DeleteView, View
-from django.http import HttpResponseForbidden
-from django.db.models import Q
-from . import models, forms, mixins, jalali, extras
+from django.core.exceptions import BadRequest
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.db import transaction
+from . import models, forms, mixins, jalali, extras, events, search, stats, tasks, pagination
 
 def custom_context(request):
     if request.user.is_authenticated:
-        not_seen_messages = models.Message.objects.filter(conversation__users=request.user, seen=False).exclude(user=request.user)
-
         return {
-            'not_seen_messages_count': not_seen_messages.count(),
+            # فقط وقتی قالب نشان را نمایش دهد محاسبه می شود
+            'not_seen_messages_count': SimpleLazyObject(lambda: models.ReadState.objects.unread_total(request.user)),
         }
     else:
         return {
@@ -54,27 +61,24 @@ def login(request):
 @login_required
 @mixins.role_required(['1'])
 def super_admin_dashboard(request):
-    users = models.CustomUser.objects.all().order_by('-id')
-    activities = models.Activity.objects.all().order_by('-id')
     profiles_awaiting = models.Profile.objects.filter(status='1').order_by('-id')
+    hidden_activities = models.Activity.objects.filter(visibility=False).order_by('-id')
 
     context = {
-        'users_count': users.count(),
-        'managers_count': users.filter(user_type='2').count(),
-        'employees_count': users.filter(user_type='3').count(),
-        'activities_count': activities.filter(visibility=True).count(),
+        **stats.super_admin_stats(),
         'profiles': profiles_awaiting,
-        'activities': activities.filter(visibility=False),
+        'activities': hidden_activities,
     }
 
     return render(request, 'super_admin/dashboard.html', context)
 
-class SuperAdminUserListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class SuperAdminUserListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['1']
     model = models.CustomUser
     template_name = 'super_admin/users.html'
     context_object_name = 'users'
     paginate_by = 100
+    show_count = True
     ordering = '-id'
 
     def get_queryset(self):
@@ -84,14 +88,9 @@ class SuperAdminUserListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListV
         user_type = self.request.GET.get('user_type')
 
         if search_full_name:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_full_name) | 
-                Q(last_name__icontains=search_full_name)
-            )
+            queryset = search.search_users_by_name(queryset, search_full_name)
         if search_user_name:
-            queryset = queryset.filter(
-                Q(username__icontains=search_user_name)
-            )
+            queryset = search.search_users_by_username(queryset, search_user_name)
         if user_type:
             queryset = queryset.filter(user_type=user_type)
 
@@ -155,11 +154,12 @@ class SuperAdminUserDeleteView(DeleteView):
         context['previous_url'] = self.request.META.get('HTTP_REFERER', '/')
         return context
 
-class SuperAdminProfileListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class SuperAdminProfileListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['1']
     model = models.Profile
     template_name = 'super_admin/profiles.html'
     paginate_by = 100
+    show_count = True
     context_object_name = 'profiles'
     ordering = '-id'
 
@@ -191,26 +191,28 @@ class SuperAdminProfileUpdateView(LoginRequiredMixin, mixins.RoleRequiredMixin,
     def get_success_url(self):
         return reverse('super_admin_profile', kwargs={'pk': self.object.id})
 
-class SuperAdminActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class SuperAdminActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['1']
     model = models.Activity
     template_name = 'super_admin/activities.html'
     context_object_name = 'activities'
     paginate_by = 100
+    show_count = True
     ordering = '-id'
 
     def get_queryset(self):
         queryset = super().get_queryset()
         search_query = self.request.GET.get('q')
         is_completed = self.request.GET.get('is_completed')
+        window = self.request.GET.get('window')
         visibility = self.request.GET.get('visibility')
 
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query)
-            )
+            queryset = search.search_activities(queryset, search_query)
         if is_completed:
             queryset = queryset.filter(is_completed=is_completed)
+        if window in models.ActivityQuerySet.WINDOW_FILTERS:
+            queryset = queryset.in_window(window)
         if visibility:
             queryset = queryset.filter(visibility=visibility)
 
@@ -219,6 +221,7 @@ class SuperAdminActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, L
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['is_completed'] = self.request.GET.get('is_completed', '')
+        context['window'] = self.request.GET.get('window', '')
         context['visibility'] = self.request.GET.get('visibility', '')
         return context
 
@@ -228,9 +231,9 @@ def super_admin_create_bulk_activity(request):
     if request.method == 'POST':
         form = forms.SuperAdminBulkActivityForm(request.POST)
         if form.is_valid():
-            users = form.cleaned_data['users']
+            user_ids = list(form.cleaned_data['users'].values_list('pk', flat=True))
             activity_data = {
-                'creater': request.user,
+                'creater_id': request.user.pk,
                 'title': form.cleaned_data['title'],
                 'body': form.cleaned_data['body'],
                 'start_date': form.cleaned_data['start_date'],
@@ -240,13 +243,29 @@ def super_admin_create_bulk_activity(request):
                 'sensitivity': form.cleaned_data['sensitivity'],
                 'visibility': True,
             }
-            for user in users:
-                models.Activity.objects.create(user=user, **activity_data)
+            if len(user_ids) > settings.BULK_ACTIVITY_BACKGROUND_THRESHOLD and tasks.jobs_supported():
+                job_id = tasks.enqueue_job(models.Activity.objects.bulk_assign, user_ids, owner=request.user.pk, **activity_data)
+                return redirect('super_admin_activity_job', job_id=job_id)
+            models.Activity.objects.bulk_assign(user_ids, **activity_data)
             return redirect('super_admin_activities')
     else:
         form = forms.SuperAdminBulkActivityForm()
     return render(request, 'super_admin/add_activity.html', {'form': form})
 
+def activity_job_response(request, job_id, template_name, success_url):
+    job = tasks.get_job(job_id)
+    if job is None or job.get('owner') != request.user.pk:
+        raise Http404
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({key: job[key] for key in ('status', 'done', 'total')})
+    return render(request, template_name, {'job_id': job_id, 'job': job, 'success_url': success_url})
+
+@login_required
+@mixins.role_required(['1'])
+def super_admin_activity_job(request, job_id):
+    return activity_job_response(request, job_id, 'super_admin/activity_job.html', reverse('super_admin_activities'))
+
 class SuperAdminActivityDetailView(LoginRequiredMixin, mixins.RoleRequiredMixin, DetailView):
     allowed_roles = ['1']
     model = models.Activity
@@ -273,7 +292,7 @@ class SuperAdminActivityDeleteView(LoginRequiredMixin, mixins.RoleRequiredMixin,
         context['previous_url'] = self.request.META.get('HTTP_REFERER', '/')
         return context
 
-class SuperAdminTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class SuperAdminTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['1']
     model = models.Conversation
     template_name = 'super_admin/tickets.html'
@@ -281,20 +300,14 @@ class SuperAdminTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, Lis
     paginate_by = 100
     ordering = ['-id']
 
+    def get_queryset(self):
+        return super().get_queryset().accessible_by(self.request.user).with_unseen_count(self.request.user)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        current_user = self.request.user
-
-        unseen_counts = {}
-
-        for conversation in context['tickets']:
-            unseen_count = conversation.conversation_messages.filter(
-                seen=False
-            ).exclude(user=current_user).count()
-
-            unseen_counts[conversation.id] = unseen_count
-
-        context['unseen_counts'] = unseen_counts
+        context['unseen_counts'] = {
+            conversation.id: conversation.unseen_count for conversation in context['tickets']
+        }
         return context
 
 class SuperAdminTicketCreateOrRedirectView(LoginRequiredMixin, mixins.RoleRequiredMixin, View):
@@ -312,19 +325,8 @@ class SuperAdminTicketCreateOrRedirectView(LoginRequiredMixin, mixins.RoleRequir
             selected_user = form.cleaned_data['user']
             current_user = request.user
 
-            conversations = models.Conversation.objects.filter(users=current_user).filter(users=selected_user)
-            conversation = None
-            for conv in conversations:
-                if conv.users.count() == 2:
-                    conversation = conv
-                    break
-
-            if conversation:
-                return redirect('chat', pk=conversation.pk)
-            else:
-                conversation = models.Conversation.objects.create()
-                conversation.users.add(current_user, selected_user)
-                return redirect('chat', pk=conversation.pk)
+            conversation = models.Conversation.objects.get_or_create_direct(current_user, selected_user)
+            return redirect('chat', pk=conversation.pk)
 
         return render(request, self.template_name, {'form': form})
 
@@ -336,27 +338,22 @@ class SuperAdminTicketCreateOrRedirectView(LoginRequiredMixin, mixins.RoleRequir
 @mixins.role_required(['2'])
 def manager_dashboard(request):
     user = request.user
-    employees = models.CustomUser.objects.filter(
-        manager=user,
-        user_type='3',
-        user_profile__status='2'
-    ).order_by('-id')
+    employees = models.CustomUser.objects.team_of(user).order_by('-id')
 
     some_employees = employees[:3]
-    some_activities = models.Activity.objects.filter(user__in=employees, visibility=True).order_by('-id')[:3]
-    some_my_activities = models.Activity.objects.filter(user=user, visibility=True).order_by('-id')[:3]
-    hidden_activities_count = models.Activity.objects.filter(creater=user, visibility=False).count()
+    some_activities = models.Activity.objects.of_team(user).filter(visibility=True).order_by('-id')[:3]
+    some_my_activities = models.Activity.objects.visible_to(user).filter(user=user).order_by('-id')[:3]
 
     context = {
+        **stats.manager_stats(user),
         'users': some_employees,
         'my_activities': some_my_activities,
         'activities': some_activities,
-        'hidden_activities_count': hidden_activities_count,
     }
 
     return render(request, 'manager/dashboard.html', context)
 
-class ManagerUserListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class ManagerUserListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['2']
     model = models.CustomUser
     template_name = 'manager/users.html'
@@ -365,14 +362,11 @@ class ManagerUserListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView
     ordering = '-id'
 
     def get_queryset(self):
-        queryset = super().get_queryset().filter(manager=self.request.user, user_type='3', user_profile__status='2')
+        queryset = super().get_queryset().team_of(self.request.user)
         search_full_name = self.request.GET.get('search_full_name')
 
         if search_full_name:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_full_name) | 
-                Q(last_name__icontains=search_full_name)
-            )
+            queryset = search.search_users_by_name(queryset, search_full_name)
 
         return queryset
 
@@ -388,7 +382,7 @@ class ManagerUserDetailView(LoginRequiredMixin, mixins.RoleRequiredMixin, mixins
         context['activities'] = user.user_activities.filter(visibility=True).order_by('-id')
         return context
 
-class ManagerMyActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class ManagerMyActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['2']
     model = models.Activity
     template_name = 'manager/my_activities.html'
@@ -397,22 +391,24 @@ class ManagerMyActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, Li
     ordering = '-id'
 
     def get_queryset(self):
-        queryset = super().get_queryset().filter(visibility=True, user=self.request.user)
+        queryset = super().get_queryset().visible_to(self.request.user).filter(user=self.request.user)
         search_query = self.request.GET.get('q')
         is_completed = self.request.GET.get('is_completed')
+        window = self.request.GET.get('window')
 
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query)
-            )
+            queryset = search.search_activities(queryset, search_query)
         if is_completed:
             queryset = queryset.filter(is_completed=is_completed)
+        if window in models.ActivityQuerySet.WINDOW_FILTERS:
+            queryset = queryset.in_window(window)
 
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['is_completed'] = self.request.GET.get('is_completed', '')
+        context['window'] = self.request.GET.get('window', '')
         return context
 
 class ManagerMyActivityDetailView(LoginRequiredMixin, mixins.RoleRequiredMixin, mixins.ActivityOwnerRequiredMixin, mixins.VisibleActivityRequiredMixin, DetailView):
@@ -439,7 +435,7 @@ class ManagerMyActivityUpdateView(LoginRequiredMixin, mixins.RoleRequiredMixin,
         context['previous_url'] = self.request.META.get('HTTP_REFERER', '/')
         return context
 
-class ManagerActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class ManagerActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['2']
     model = models.Activity
     template_name = 'manager/activities.html'
@@ -448,21 +444,17 @@ class ManagerActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, List
     ordering = '-id'
 
     def get_queryset(self):
-        queryset = super().get_queryset().filter(
-            visibility=True,
-            user__manager=self.request.user,
-            user__user_type='3',
-            user__user_profile__status='2'
-        )
+        queryset = super().get_queryset().of_team(self.request.user).filter(visibility=True)
         search_query = self.request.GET.get('q')
         is_completed = self.request.GET.get('is_completed')
+        window = self.request.GET.get('window')
 
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query)
-            )
+            queryset = search.search_activities(queryset, search_query)
         if is_completed:
             queryset = queryset.filter(is_completed=is_completed)
+        if window in models.ActivityQuerySet.WINDOW_FILTERS:
+            queryset = queryset.in_window(window)
 
         return queryset
 
@@ -472,6 +464,7 @@ class ManagerActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, List
         hidden_activities_count = models.Activity.objects.filter(creater=user, visibility=False).count()
 
         context['is_completed'] = self.request.GET.get('is_completed', '')
+        context['window'] = self.request.GET.get('window', '')
         context['hidden_activities_count'] = hidden_activities_count
 
         return context
@@ -482,9 +475,9 @@ def manager_create_bulk_activity(request):
     if request.method == 'POST':
         form = forms.ManagerBulkActivityForm(request.POST, user=request.user)
         if form.is_valid():
-            users = form.cleaned_data['users']
+            user_ids = list(form.cleaned_data['users'].values_list('pk', flat=True))
             activity_data = {
-                'creater': request.user,
+                'creater_id': request.user.pk,
                 'title': form.cleaned_data['title'],
                 'body': form.cleaned_data['body'],
                 'start_date': form.cleaned_data['start_date'],
@@ -494,20 +487,27 @@ def manager_create_bulk_activity(request):
                 'sensitivity': form.cleaned_data['sensitivity'],
                 'visibility': False,
             }
-            for user in users:
-                models.Activity.objects.create(user=user, **activity_data)
+            if len(user_ids) > settings.BULK_ACTIVITY_BACKGROUND_THRESHOLD and tasks.jobs_supported():
+                job_id = tasks.enqueue_job(models.Activity.objects.bulk_assign, user_ids, owner=request.user.pk, **activity_data)
+                return redirect('manager_activity_job', job_id=job_id)
+            models.Activity.objects.bulk_assign(user_ids, **activity_data)
             return redirect('manager_activities')
     else:
         form = forms.ManagerBulkActivityForm(user=request.user)
     return render(request, 'manager/add_activity.html', {'form': form})
 
+@login_required
+@mixins.role_required(['2'])
+def manager_activity_job(request, job_id):
+    return activity_job_response(request, job_id, 'manager/activity_job.html', reverse('manager_activities'))
+
 class ManagerActivityDetailView(LoginRequiredMixin, mixins.RoleRequiredMixin, mixins.ManagerActivityRequiredMixin, DetailView):
     allowed_roles = ['2']
     model = models.Activity
     template_name = 'manager/activity.html'
     context_object_name = 'activity'
 
-class ManagerTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class ManagerTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['2']
     model = models.Conversation
     template_name = 'manager/tickets.html'
@@ -516,23 +516,13 @@ class ManagerTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListVi
     ordering = '-id'
 
     def get_queryset(self):
-        return super().get_queryset().filter(users=self.request.user)
+        return super().get_queryset().accessible_by(self.request.user).with_unread_count(self.request.user)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        current_user = self.request.user
-
-        unseen_counts = {}
-
-        for conversation in context['tickets']:
-            unseen_count = conversation.conversation_messages.filter(
-                seen=False
-            ).exclude(user=current_user).count()
-
-            unseen_counts[conversation.id] = unseen_count
-
-        context['unseen_counts'] = unseen_counts
+        context['unseen_counts'] = {
+            conversation.id: conversation.unread_count for conversation in context['tickets']
+        }
         return context
 
 class ManagerTicketCreateOrRedirectView(LoginRequiredMixin, mixins.RoleRequiredMixin, View):
@@ -550,19 +540,8 @@ class ManagerTicketCreateOrRedirectView(LoginRequiredMixin, mixins.RoleRequiredM
             selected_user = form.cleaned_data['user']
             current_user = request.user
 
-            conversations = models.Conversation.objects.filter(users=current_user).filter(users=selected_user)
-            conversation = None
-            for conv in conversations:
-                if conv.users.count() == 2:
-                    conversation = conv
-                    break
-
-            if conversation:
-                return redirect('chat', pk=conversation.pk)
-            else:
-                conversation = models.Conversation.objects.create()
-                conversation.users.add(current_user, selected_user)
-                return redirect('chat', pk=conversation.pk)
+            conversation = models.Conversation.objects.get_or_create_direct(current_user, selected_user)
+            return redirect('chat', pk=conversation.pk)
 
         return render(request, self.template_name, {'form': form})
 
@@ -573,7 +552,7 @@ class ManagerTicketCreateOrRedirectView(LoginRequiredMixin, mixins.RoleRequiredM
 @login_required
 @mixins.role_required(['3'])
 def employee_dashboard(request):
-    some_activities = models.Activity.objects.filter(visibility=True, user=request.user).order_by('-id')[:3]
+    some_activities = models.Activity.objects.visible_to(request.user).order_by('-id')[:3]
 
     context = {
         'activities': some_activities,
@@ -608,7 +587,7 @@ class EmployeeProfileUpdateView(LoginRequiredMixin, mixins.RoleRequiredMixin, mi
     def get_success_url(self):
         return reverse('employee_profile', kwargs={'pk': self.object.id})
 
-class EmployeeActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, mixins.ApprovedProfileRequiredMixin, ListView):
+class EmployeeActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, mixins.ApprovedProfileRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['3']
     model = models.Activity
     template_name = 'employee/activities.html'
@@ -617,22 +596,24 @@ class EmployeeActivityListView(LoginRequiredMixin, mixins.RoleRequiredMixin, mix
     ordering = '-id'
 
     def get_queryset(self):
-        queryset = super().get_queryset().filter(visibility=True, user=self.request.user)
+        queryset = super().get_queryset().visible_to(self.request.user).filter(user=self.request.user)
         search_query = self.request.GET.get('q')
         is_completed = self.request.GET.get('is_completed')
+        window = self.request.GET.get('window')
 
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query)
-            )
+            queryset = search.search_activities(queryset, search_query)
         if is_completed:
             queryset = queryset.filter(is_completed=is_completed)
+        if window in models.ActivityQuerySet.WINDOW_FILTERS:
+            queryset = queryset.in_window(window)
 
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['is_completed'] = self.request.GET.get('is_completed', '')
+        context['window'] = self.request.GET.get('window', '')
         return context
 
 class EmployeeActivityDetailView(LoginRequiredMixin, mixins.RoleRequiredMixin, mixins.ActivityOwnerRequiredMixin, mixins.VisibleActivityRequiredMixin, mixins.ApprovedProfileRequiredMixin, DetailView):
@@ -659,7 +640,7 @@ class EmployeeActivityUpdateView(LoginRequiredMixin, mixins.RoleRequiredMixin, m
         context['previous_url'] = self.request.META.get('HTTP_REFERER', '/')
         return context
 
-class EmployeeTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListView):
+class EmployeeTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, pagination.KeysetPaginationMixin, ListView):
     allowed_roles = ['3']
     model = models.Conversation
     template_name = 'employee/tickets.html'
@@ -668,23 +649,13 @@ class EmployeeTicketListView(LoginRequiredMixin, mixins.RoleRequiredMixin, ListV
     ordering = '-id'
 
     def get_queryset(self):
-        return super().get_queryset().filter(users=self.request.user)
+        return super().get_queryset().accessible_by(self.request.user).with_unread_count(self.request.user)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        current_user = self.request.user
-
-        unseen_counts = {}
-
-        for conversation in context['tickets']:
-            unseen_count = conversation.conversation_messages.filter(
-                seen=False
-            ).exclude(user=current_user).count()
-
-            unseen_counts[conversation.id] = unseen_count
-
-        context['unseen_counts'] = unseen_counts
+        context['unseen_counts'] = {
+            conversation.id: conversation.unread_count for conversation in context['tickets']
+        }
         return context
 
 class EmployeeTicketCreateOrRedirectView(LoginRequiredMixin, mixins.RoleRequiredMixin, View):
@@ -702,104 +673,202 @@ class EmployeeTicketCreateOrRedirectView(LoginRequiredMixin, mixins.RoleRequired
             selected_user = form.cleaned_data['user']
             current_user = request.user
 
-            conversations = models.Conversation.objects.filter(users=current_user).filter(users=selected_user)
-            conversation = None
-            for conv in conversations:
-                if conv.users.count() == 2:
-                    conversation = conv
-                    break
-
-            if conversation:
-                return redirect('chat', pk=conversation.pk)
-            else:
-                conversation = models.Conversation.objects.create()
-                conversation.users.add(current_user, selected_user)
-                return redirect('chat', pk=conversation.pk)
+            conversation = models.Conversation.objects.get_or_create_direct(current_user, selected_user)
+            return redirect('chat', pk=conversation.pk)
 
         return render(request, self.template_name, {'form': form})
 
 # endregion
 
+def persian_date(day):
+    y, m, d = jalali.Gregorian(day).persian_tuple()
+    return f"{d} {extras.PERSIAN_MONTHS[m]} {y}"
+
+def prepare_messages(user, conversation, messages):
+    # اعضای تیکت یک بار خوانده می شوند تا تعداد کوئری ها با تعداد پیام ها زیاد نشود
+    participant_ids = set(conversation.users.values_list('id', flat=True))
+    viewer_is_participant = user.id in participant_ids
+    messages = list(messages)
+    for message in messages:
+        message.own = message.user_id == user.id
+        message.from_participant = message.user_id in participant_ids
+        message.show_sender = message.from_participant and not viewer_is_participant
+        message.can_manage = message.own or (message.from_participant and user.user_type == '1')
+        # بخشی از کلید کش قطعه پیام در chat/message.html
+        message.perspective = ''.join('1' if flag else '0' for flag in (
+            message.own, message.from_participant, message.show_sender, message.can_manage,
+        ))
+    return messages
+
 @login_required
 @mixins.user_in_conversation_or_admin
 def chat(request, pk):
     user = request.user
-    conversation = models.Conversation.objects.get(pk=pk)
-    all_messages = models.Message.objects.filter(conversation=conversation).order_by('-created_at')
-    messages = all_messages[:50]
-    messages = reversed(messages)
+    conversation = mixins.get_request_object(request, models.Conversation, pk)
+    all_messages = models.Message.objects.filter(conversation=conversation).select_related('user').with_seen().order_by('-id')
+    messages = prepare_messages(user, conversation, all_messages[:50])
 
-    you_messages_not_seen = all_messages.exclude(user=user).filter(seen=False)
-    for you_message_not_seen in you_messages_not_seen:
-        you_message_not_seen.seen = True
-        you_message_not_seen.save()
+    if messages:
+        models.ReadState.objects.mark_read(user, conversation, max(message.id for message in messages))
+        if any(not message.seen and message.user_id != user.id for message in messages):
+            events.notify(conversation.pk)
+
+    messages = reversed(messages)
 
     grouped_messages = defaultdict(list)
     for message in messages:
-        msg_date = message.created_at.date()
+        msg_date = localtime(message.created_at).date()
         grouped_messages[msg_date].append(message)
 
     messages_by_day = []
     for day, msgs in grouped_messages.items():
-        y, m, d = jalali.Gregorian(day).persian_tuple()
-        persian_date = f"{d} {extras.PERSIAN_MONTHS[m]} {y}"
         messages_by_day.append({
-            "date": persian_date,
+            "date": persian_date(day),
             "messages": msgs
         })
 
     context = {
         "user": user,
         "conversation": conversation,
-        "messages_by_day": messages_by_day
+        "messages_by_day": messages_by_day,
+        "chat_push_enabled": settings.CHAT_PUSH_ENABLED,
+        "chat_version": events.get_version(conversation.pk),
+        "chat_message_ttl": settings.CHAT_MESSAGE_CACHE_TTL,
     }
     return render(request, 'chat/chat.html', context)
 
-@login_required
-@mixins.user_in_conversation_or_admin
-def update_chat(request, pk):
-    user = request.user
-    after_id = request.GET.get("after_id")
-    conversation = get_object_or_404(models.Conversation, pk=pk)
+def message_id_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f'{name} نامعتبر است.')
 
-    messages = models.Message.objects.filter(
+def render_new_messages(request, pk, after_id):
+    conversation = mixins.get_request_object(request, models.Conversation, pk)
+
+    messages = prepare_messages(request.user, conversation, models.Message.objects.filter(
         conversation=conversation, id__gt=after_id
-    ).order_by("created_at")
+    ).select_related('user').with_seen().order_by("id"))
 
     context = {
-        'user': user,
+        'user': request.user,
         'conversation': conversation,
         'messages': messages,
+        'chat_message_ttl': settings.CHAT_MESSAGE_CACHE_TTL,
     }
 
     return render(request, "chat/messages.html", context)
 
+def conversation_etag(request, pk, *args, **kwargs):
+    # پاسخ به after_id / before_id / limit هم بستگی دارد، پس رشته پرس و جو بخشی از ETag است
+    conversation = mixins.get_request_object(request, models.Conversation, pk)
+    query = hashlib.md5(request.GET.urlencode().encode()).hexdigest()
+    return f'{pk}-{conversation.version}-{request.user.pk}-{query}'
+
 @login_required
 @mixins.user_in_conversation_or_admin
-def load_older_messages(request, pk):
-    before_id = request.GET.get("before_id")
-    conversation = get_object_or_404(models.Conversation, pk=pk)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conversation_etag)
+def update_chat(request, pk):
+    after_id = message_id_param(request, "after_id")
+    return render_new_messages(request, pk, after_id)
 
-    messages = models.Message.objects.filter(
-        conversation=conversation, id__lt=before_id
-    ).order_by('-created_at')[:50]
-    messages = reversed(messages)
+@login_required
+@mixins.user_in_conversation_or_admin
+async def wait_chat(request, pk):
+    if not settings.CHAT_PUSH_ENABLED:
+        return HttpResponse(status=404)
+
+    after_id = message_id_param(request, "after_id")
+    try:
+        version = int(request.GET.get("version", 0))
+    except ValueError:
+        version = 0
+
+    current = await events.wait_for_change(pk, version)
+    if current == version:
+        response = HttpResponse(status=204)
+    else:
+        response = await sync_to_async(render_new_messages)(request, pk, after_id)
+    response['X-Chat-Version'] = current
+    response['Cache-Control'] = 'no-store'
+    return response
 
-    context = {
-        'user': request.user,
-        'conversation': conversation,
-        'messages': messages,
-    }
+@login_required
+@mixins.user_in_conversation_or_admin
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=conversation_etag)
+def message_history(request, pk):
+    user = request.user
+    conversation = mixins.get_request_object(request, models.Conversation, pk)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 100)
+    except ValueError:
+        limit = 50
+
+    messages = models.Message.objects.filter(conversation=conversation).select_related('user').with_seen()
+    before_id = message_id_param(request, 'before_id')
+    if before_id:
+        messages = messages.filter(id__lt=before_id)
+
+    # یک ردیف بیشتر از limit خوانده می شود تا وجود پیام های قدیمی تر بدون کوئری دوم مشخص شود
+    messages = prepare_messages(user, conversation, messages.order_by('-id')[:limit + 1])
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    dates = {}
+    records = []
+    for message in reversed(messages):
+        created_at = localtime(message.created_at)
+        day = created_at.date()
+        if day not in dates:
+            dates[day] = persian_date(day)
+        records.append({
+            'id': message.id,
+            'body': message.body,
+            'file': message.file.url if message.file else None,
+            'date': dates[day],
+            'time': created_at.strftime('%H:%M'),
+            'user': str(message.user) if message.show_sender else None,
+            'own': message.own,
+            'seen': message.seen,
+            'from_participant': message.from_participant,
+            'can_manage': message.can_manage,
+        })
+
+    return JsonResponse({
+        'messages': records,
+        'has_more': has_more,
+        'next_before_id': messages[-1].id if has_more else None,
+    })
 
-    has_more = models.Message.objects.filter(conversation=conversation, id__lt=before_id).exists()
+@login_required
+def search_messages(request):
+    query = request.GET.get('q', '').strip()
+    results = search.search_messages(request.user, query)[:100] if query else []
+
+    base_templates = {
+        '1': 'base_super_admin_dashboard.html',
+        '2': 'base_manager_dashboard.html',
+        '3': 'base_employee_dashboard.html',
+    }
 
-    return render(request, "chat/load_older.html", context | {"has_more": has_more})
+    context = {
+        'base_template': base_templates.get(request.user.user_type, 'base_employee_dashboard.html'),
+        'query': query,
+        'results': results,
+    }
+    return render(request, 'chat/search.html', context)
 
 @login_required
 @mixins.user_in_conversation_or_admin
 def add_chat(request, pk):
     user = request.user
-    conversation = get_object_or_404(models.Conversation, pk=pk)
+    conversation = mixins.get_request_object(request, models.Conversation, pk)
 
     if request.method == 'POST':
         form = forms.ChatCreateForm(request.POST, request.FILES)
@@ -807,26 +876,32 @@ def add_chat(request, pk):
             message = form.save(commit=False)
             message.user = user
             message.conversation = conversation
-            message.save()
+            with transaction.atomic():
+                message.save()
+                events.notify(conversation.pk)
     return redirect('chat', pk=conversation.pk)
 
 @login_required
 @mixins.user_is_message_owner_or_admin
 def edit_chat(request, pk):
-    message = get_object_or_404(models.Message, pk=pk)
+    message = mixins.get_request_object(request, models.Message, pk)
 
     if request.method == 'POST':
         form = forms.ChatUpdateForm(request.POST, request.FILES, instance=message)
         if form.is_valid():
-            form.save()
-    return redirect('chat', pk=message.conversation.pk)
+            with transaction.atomic():
+                form.save()
+                events.notify(message.conversation_id)
+    return redirect('chat', pk=message.conversation_id)
 
 @login_required
 @mixins.user_is_message_owner_or_admin
 def delete_chat(request, pk):
-    message = get_object_or_404(models.Message, pk=pk)
+    message = mixins.get_request_object(request, models.Message, pk)
 
     if request.method == 'POST':
-        conversation_pk = message.conversation.pk
-        message.delete()
+        conversation_pk = message.conversation_id
+        with transaction.atomic():
+            message.delete()
+            events.notify(conversation_pk)
         return redirect('chat', pk=conversation_pk)
\ No newline at end of file
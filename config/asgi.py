@@ -3,6 +3,10 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The chat push channel (``app.views.wait_chat``) is an async long-poll view, so
+serve the project through this module (e.g. ``uvicorn config.asgi:application``)
+to keep waiting clients from holding worker threads.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
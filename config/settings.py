@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,10 +77,26 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Applied to every new SQLite connection. WAL lets readers run next to the single writer,
+# busy_timeout makes a writer wait for the lock instead of failing, and IMMEDIATE transactions
+# take the write lock at BEGIN so two read-then-write transactions cannot deadlock.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -32000,  # KiB
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -137,4 +154,60 @@ AUTH_USER_MODEL = 'app.CustomUser'
 LOGIN_URL = '/login/'
 LOGOUT_REDIRECT_URL = "login"
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Chat push channel (long-poll served by async views, see config/asgi.py)
+# Falls back to the 5 second polling of update_chat when disabled or unavailable.
+
+CHAT_PUSH_ENABLED = True
+CHAT_PUSH_TIMEOUT = 25
+CHAT_PUSH_INTERVAL = 1
+
+# Background tasks (in-process worker threads, see app/tasks.py). Job progress is kept in the default
+# cache, so bulk work only goes to the background when that cache is shared between processes.
+
+BACKGROUND_TASKS_EAGER = False
+BACKGROUND_TASK_WORKERS = 2
+BACKGROUND_JOB_TTL = 60 * 60
+
+# Bulk activity assignment
+
+BULK_ACTIVITY_BATCH_SIZE = 500
+BULK_ACTIVITY_BACKGROUND_THRESHOLD = 1000
+
+# Dashboard counters (app/stats.py), invalidated on user, profile and activity changes
+
+DASHBOARD_STATS_TTL = 60
+
+# Unread messages badge, cached per user and invalidated when read states change
+
+UNREAD_BADGE_TTL = 60 * 5
+
+# Totals shown by keyset pagination (app/pagination.py); counting stops here and larger lists show "more than"
+
+PAGINATION_COUNT_LIMIT = 1000
+
+# Rendered chat message fragments (templates/chat/message.html). They are kept in their own cache so
+# the long-lived fragments do not push the counters and job status out of the default cache.
+# The fragment keys carry the message version, so a per-process cache never serves stale markup; the
+# badge, dashboard counters and job status are invalidated by key and need the default cache shared
+# between worker processes (the table is created by migration 0019, or by createcachetable).
+
+CHAT_MESSAGE_CACHE_TTL = 60 * 60 * 24
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'app_cache',
+    },
+    'chat_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chat-fragments',
+        'TIMEOUT': CHAT_MESSAGE_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Response compression (app/middleware.py); brotli is used when the package is installed
+
+BROTLI_QUALITY = 5
\ No newline at end of file
@@ -24,31 +24,135 @@ function getCookie(name) {
 
 const csrftoken = getCookie('csrftoken');
 
+const chatId = window.location.pathname.split('/')[2];
+let chatVersion = scrollingBox.dataset.version || 0;
+let pollingTimer = null;
+let updateEtag = null;
+
+function lastMessageId() {
+    return $('#chat-content .media-chat').last().attr('id') || 0;
+}
+
+function appendMessages(data) {
+    if (data && data.trim().length > 0) {
+        const atBottom = scrollingBox.scrollTop + scrollingBox.clientHeight >= scrollingBox.scrollHeight - 50;
+        $('#chat-content').append(data);
+
+        if (atBottom) {
+            scrollingBox.scrollTop = scrollingBox.scrollHeight;
+        }
+    }
+}
+
 function fetchMessages() {
-    const lastMessageId = $('#chat-content .media-chat').last().attr('id') || 0;
-    const chatId = window.location.pathname.split('/')[2];
-    const requestUrl = `/chats/${chatId}/update/?after_id=${lastMessageId}`;
+    const requestUrl = `/chats/${chatId}/update/?after_id=${lastMessageId()}`;
 
     $.ajax({
         url: requestUrl,
         type: 'GET',
-        success: function (data) {
-            if (data.trim().length > 0) {
-                const atBottom = scrollingBox.scrollTop + scrollingBox.clientHeight >= scrollingBox.scrollHeight - 50;
-                $('#chat-content').append(data);
+        headers: updateEtag ? { 'If-None-Match': updateEtag } : {},
+        success: function (data, textStatus, xhr) {
+            if (xhr.status === 304) {
+                return;
+            }
+            updateEtag = xhr.getResponseHeader('ETag');
+            appendMessages(data);
+        }
+    });
+}
 
-                if (atBottom) {
-                    scrollingBox.scrollTop = scrollingBox.scrollHeight;
-                }
+function startPolling() {
+    if (pollingTimer === null) {
+        pollingTimer = setInterval(fetchMessages, 5000);
+    }
+}
+
+function waitForMessages() {
+    $.ajax({
+        url: `/chats/${chatId}/wait/`,
+        type: 'GET',
+        data: { "after_id": lastMessageId(), "version": chatVersion },
+        timeout: 60000,
+        success: function (data, textStatus, xhr) {
+            const version = xhr.getResponseHeader('X-Chat-Version');
+            if (version === null) {
+                startPolling();
+                return;
             }
+            chatVersion = version;
+            if (xhr.status === 200) {
+                appendMessages(data);
+            }
+            waitForMessages();
+        },
+        error: function () {
+            // کانال push در دسترس نیست؛ بازگشت به polling
+            startPolling();
         }
     });
 }
 
 $(document).ready(function () {
-    setInterval(fetchMessages, 5000);
+    if (scrollingBox.dataset.push === 'true') {
+        waitForMessages();
+    } else {
+        startPolling();
+    }
 });
 
+const iconsUrl = scrollingBox.dataset.icons;
+
+function icon(name, size, extra) {
+    return `<svg width="${size}" height="${size}" fill="currentColor" ${extra || ''}><use href="${iconsUrl}#${name}"/></svg>`;
+}
+
+const ICONS = {
+    check: icon('check', 16, 'class="bi bi-check"'),
+    checkAll: icon('check-all', 16, 'class="bi bi-check-all"'),
+    dots: icon('three-dots', 16, 'onclick="showInfo(this)" class="bi bi-three-dots"')
+};
+
+function escapeHtml(text) {
+    return String(text)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+function renderMessage(message) {
+    const body = `<span class="message-body">${escapeHtml(message.body)}</span>`;
+    let text;
+    if (!message.from_participant) {
+        text = 'پیغام مدیر کل: ' + body;
+    } else if (message.user) {
+        text = escapeHtml(message.user) + ' : ' + body;
+    } else {
+        text = body;
+    }
+    if (message.own) {
+        text += '<br>' + (message.seen ? ICONS.checkAll : ICONS.check);
+    }
+
+    const bubbleStyle = message.from_participant ? 'margin-left: 5px;' : 'margin-left: 5px; background-color: rgb(255, 38, 38) !important;';
+    let html = `<div class="media media-chat ${message.own ? '' : 'media-chat-reverse'}" id="${message.id}" data-date="${escapeHtml(message.date)}">`
+        + '<div class="media-body" style="display: flex; flex-direction: column;">'
+        + `<p dir="rtl" style="${bubbleStyle}">${text}</p>`;
+
+    if (message.file) {
+        html += '<div style="display: flex; justify-content: center; align-items: center; padding: 10px; border-radius: 3px; background-color: #fff;">'
+            + `<a href="${escapeHtml(message.file)}" download>دانلود فایل ضمیمه</a></div>`;
+    }
+
+    html += '<p class="meta me info" style="color: black;">'
+        + `<time style="background-color: #fff !important;">${message.time}</time>`
+        + (message.can_manage ? ICONS.dots : '')
+        + '</p></div>';
+
+    return html + '</div>';
+}
+
 $(document).ready(function () {
     $("#load-older").on("click", function () {
         var chatContent = $("#chat-content");
@@ -58,10 +162,11 @@ $(document).ready(function () {
         var oldScrollTop = chatContent.scrollTop();
 
         $.ajax({
-            url: window.location.pathname.replace(/\/$/, "") + "/load_older/",
+            url: `/chats/${chatId}/messages/`,
             data: { "before_id": firstMessageId },
+            dataType: "json",
             success: function (data) {
-                $("#load-older").after(data);
+                $("#load-older").after(data.messages.map(renderMessage).join(''));
 
                 requestAnimationFrame(function () {
                     var newScrollHeight = chatContent[0].scrollHeight;
@@ -69,7 +174,7 @@ $(document).ready(function () {
                     chatContent.scrollTop(oldScrollTop + diff);
                 });
 
-                if ($("#no-more-messages").length > 0) {
+                if (!data.has_more) {
                     $("#load-older").text("📜 پیام قدیمی تری موجود نیست").css("color", "gray");
                     $("#load-older").off("click");
                 }
@@ -119,23 +224,34 @@ down.addEventListener('click', () => {
 window.addEventListener('load', checkScrollability);
 
 const black = document.querySelector('.black');
-function showInfo(button) {
-    const parent1 = button.parentElement;
-    const parent2 = parent1.parentElement;
-    const parent3 = parent2.parentElement;
-    const x = parent3.querySelector('#x');
-    const id = parent3.id;
-
-    const infoId = `info_${id}`;
-    const infoDiv = document.getElementById(infoId);
-
-    if (infoDiv) {
-        infoDiv.style.display = 'block';
-        black.style.display = 'block';
+const actions = document.getElementById('message-actions');
+
+function messageDate(message) {
+    if (message.dataset.date) {
+        return message.dataset.date;
     }
+    let node = message.previousElementSibling;
+    while (node && !node.classList.contains('media-meta-day')) {
+        node = node.previousElementSibling;
+    }
+    return node ? node.textContent.trim() : '';
+}
 
-    x.addEventListener('click', () => {
-        infoDiv.style.display = 'none';
-        black.style.display = 'none';
-    });
+// یک منوی مشترک برای همه پیام ها؛ هنگام باز شدن با اطلاعات همان پیام پر می شود
+function showInfo(button) {
+    const message = button.closest('.media-chat');
+    const id = message.id;
+
+    actions.querySelector('.message-sent').textContent = `${messageDate(message)} ${message.querySelector('time').textContent.trim()}`;
+    actions.querySelector('.edit-form').action = actions.dataset.editUrl.replace('/0/', `/${id}/`);
+    actions.querySelector('.edit-form [name="body"]').value = message.querySelector('.message-body').textContent;
+    actions.querySelector('.delete-form').action = actions.dataset.deleteUrl.replace('/0/', `/${id}/`);
+
+    actions.style.display = 'block';
+    black.style.display = 'block';
 }
+
+actions.querySelector('#x').addEventListener('click', () => {
+    actions.style.display = 'none';
+    black.style.display = 'none';
+});